@@ -0,0 +1,239 @@
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from sqlalchemy import select, func, update, delete
+from models import db, Showtime, AdmissionTicket
+
+
+class AdmissionError(Exception):
+    """Raised when an admission token's ticket was already used or has lapsed."""
+    pass
+
+
+class AdmissionControl:
+    """Virtual waiting room in front of the booking endpoints.
+
+    Showtimes with an admission_ceiling only let that many users book at a
+    time. Everyone else holds a ticket in a FIFO queue (admission_tickets)
+    and polls for their position. An admitted user gets a signed token that
+    the booking endpoints check without touching the database; the booking
+    transaction then consumes the ticket with a conditional UPDATE, so each
+    token books once. A slot is freed when the booking succeeds or the
+    admission window runs out.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._serializer = None
+        self._ceilings = {}  # showtime_id -> (ceiling, fetched_at)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+
+    @property
+    def serializer(self):
+        if self._serializer is None:
+            self._serializer = URLSafeTimedSerializer(self.app.config['JWT_SECRET_KEY'], salt='admission')
+        return self._serializer
+
+    @property
+    def window(self):
+        return self.app.config['ADMISSION_WINDOW_SECONDS']
+
+    def ceiling(self, showtime_id):
+        """The showtime's admission ceiling (None when off), cached for a few seconds."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._ceilings.get(showtime_id)
+        if cached and now - cached[1] < self.app.config['ADMISSION_CEILING_CACHE_SECONDS']:
+            return cached[0]
+        ceiling = db.session.query(Showtime.admission_ceiling).filter(Showtime.id == showtime_id).scalar()
+        with self._lock:
+            self._ceilings[showtime_id] = (ceiling, now)
+        return ceiling
+
+    def forget_ceiling(self, showtime_id):
+        with self._lock:
+            self._ceilings.pop(showtime_id, None)
+
+    def ticket_for(self, showtime_id, user_id):
+        """The user's latest waiting or admitted ticket for the showtime, or None."""
+        ticket = AdmissionTicket.query.filter(
+            AdmissionTicket.showtime_id == showtime_id,
+            AdmissionTicket.user_id == user_id,
+            AdmissionTicket.status.in_(['waiting', 'admitted'])
+        ).order_by(AdmissionTicket.id.desc()).first()
+        if ticket and self._lapsed(ticket):
+            return None
+        return ticket
+
+    def join(self, showtime_id, user_id):
+        """Return the user's live ticket for the showtime, creating one if needed. Caller commits."""
+        ticket = self.ticket_for(showtime_id, user_id)
+        if ticket is None:
+            ticket = AdmissionTicket(showtime_id=showtime_id, user_id=user_id)
+            db.session.add(ticket)
+            db.session.flush()
+        return ticket
+
+    def _lapsed(self, ticket):
+        return ticket.status == 'admitted' and ticket.admitted_at < datetime.utcnow() - timedelta(seconds=self.window)
+
+    def poll(self, ticket):
+        """
+        Advance the queue for this ticket and report its state.
+
+        A waiting ticket is admitted when it is within the free slots at the
+        front of the queue; that is the only write a poll makes. The admit is
+        one conditional UPDATE that re-counts the active tickets, under a
+        row lock on the showtime where the database has them, so concurrent
+        polls cannot both take the last slot.
+        :return: dict with state, and position/eta_seconds or token/expires_in
+        """
+        now = datetime.utcnow()
+        window_start = now - timedelta(seconds=self.window)
+        ceiling = self.ceiling(ticket.showtime_id)
+
+        if ticket.status == 'waiting':
+            if ceiling is None:
+                free = 1  # The waiting room was switched off; let everyone through
+                ahead = 0
+            else:
+                active = db.session.query(func.count(AdmissionTicket.id)).filter(
+                    AdmissionTicket.showtime_id == ticket.showtime_id,
+                    AdmissionTicket.status == 'admitted',
+                    AdmissionTicket.admitted_at > window_start
+                ).scalar()
+                free = ceiling - active
+                ahead = db.session.query(func.count(AdmissionTicket.id)).filter(
+                    AdmissionTicket.showtime_id == ticket.showtime_id,
+                    AdmissionTicket.status == 'waiting',
+                    AdmissionTicket.id < ticket.id
+                ).scalar()
+            if ahead >= free:
+                return {
+                    "state": "waiting",
+                    "position": ahead + 1,
+                    "eta_seconds": self._eta(ticket.showtime_id, ahead + 1 - max(free, 0), ceiling, window_start)
+                }
+            if not self._admit(ticket, ceiling, now, window_start):
+                db.session.rollback()
+                return {
+                    "state": "waiting",
+                    "position": ahead + 1,
+                    "eta_seconds": self._eta(ticket.showtime_id, 1, ceiling, window_start)
+                }
+            db.session.commit()
+            db.session.refresh(ticket)
+
+        if ticket.status == 'admitted' and not self._lapsed(ticket):
+            expires_in = self.window - int((now - ticket.admitted_at).total_seconds())
+            return {"state": "admitted", "token": self.issue_token(ticket), "expires_in": expires_in}
+        return {"state": ticket.status if ticket.status == 'done' else 'expired'}
+
+    def _admit(self, ticket, ceiling, now, window_start):
+        """Admit a waiting ticket if a slot is still free when the UPDATE runs. Caller commits."""
+        condition = [AdmissionTicket.id == ticket.id, AdmissionTicket.status == 'waiting']
+        if ceiling is not None:
+            db.session.execute(select(Showtime.id).where(Showtime.id == ticket.showtime_id).with_for_update())
+            active = (
+                select(func.count(AdmissionTicket.id))
+                .where(
+                    AdmissionTicket.showtime_id == ticket.showtime_id,
+                    AdmissionTicket.status == 'admitted',
+                    AdmissionTicket.admitted_at > window_start
+                )
+                .scalar_subquery()
+            )
+            condition.append(active < ceiling)
+        result = db.session.execute(
+            update(AdmissionTicket).where(*condition).values(status='admitted', admitted_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+
+    def _eta(self, showtime_id, places, ceiling, window_start):
+        """Estimate seconds until admission from the recent admission rate, or the window if there is none."""
+        recent = db.session.query(func.count(AdmissionTicket.id)).filter(
+            AdmissionTicket.showtime_id == showtime_id,
+            AdmissionTicket.admitted_at > window_start
+        ).scalar()
+        if recent:
+            return math.ceil(places * self.window / recent)
+        return math.ceil(places / max(ceiling or 1, 1)) * self.window
+
+    def issue_token(self, ticket):
+        return self.serializer.dumps({"t": ticket.id, "s": ticket.showtime_id, "u": ticket.user_id})
+
+    def verify(self, showtime_ids, user_id, header):
+        """
+        Check admission for every showtime that has a waiting room.
+
+        :param header: X-Admission-Token value, one token per showtime, comma separated
+        :return: (error message or None, ticket ids that were used)
+        """
+        gated = [showtime_id for showtime_id in set(showtime_ids) if self.ceiling(showtime_id) is not None]
+        if not gated:
+            return None, []
+
+        admitted = {}
+        for token in filter(None, (header or '').split(',')):
+            try:
+                claims = self.serializer.loads(token.strip(), max_age=self.window)
+            except BadSignature:
+                continue
+            if claims.get("u") == user_id:
+                admitted[claims.get("s")] = claims.get("t")
+
+        missing = [showtime_id for showtime_id in gated if showtime_id not in admitted]
+        if missing:
+            return (f"This showtime has a waiting room. Join it at /showtimes/{missing[0]}/queue "
+                    "and send the admission token in X-Admission-Token"), []
+        return None, [admitted[showtime_id] for showtime_id in gated]
+
+    def complete(self, ticket_ids):
+        """
+        Use up the tickets of a booking inside its transaction, freeing their slots.
+
+        Only tickets that are still admitted and within the window are
+        changed, so a token whose ticket was already used books nothing.
+        Caller commits.
+
+        :raises AdmissionError: if any ticket was already used or has lapsed; the caller must roll back
+        """
+        if not ticket_ids:
+            return
+        window_start = datetime.utcnow() - timedelta(seconds=self.window)
+        result = db.session.execute(
+            update(AdmissionTicket)
+            .where(
+                AdmissionTicket.id.in_(ticket_ids),
+                AdmissionTicket.status == 'admitted',
+                AdmissionTicket.admitted_at > window_start
+            )
+            .values(status='done')
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != len(set(ticket_ids)):
+            raise AdmissionError("Your admission token was already used or has expired. Rejoin the queue")
+
+    def reopen(self, ticket_ids):
+        """Give completed tickets back after their booking failed, e.g. on a declined card. Caller commits."""
+        if ticket_ids:
+            db.session.execute(
+                update(AdmissionTicket).where(AdmissionTicket.id.in_(ticket_ids), AdmissionTicket.status == 'done')
+                .values(status='admitted')
+                .execution_options(synchronize_session=False)
+            )
+
+    def purge(self, older_than):
+        """Delete tickets created before older_than. Returns the number removed."""
+        result = db.session.execute(delete(AdmissionTicket).where(AdmissionTicket.created_at < older_than))
+        db.session.commit()
+        return result.rowcount
+
+
+admission = AdmissionControl()
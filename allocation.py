@@ -0,0 +1,103 @@
+from seat_store import seat_store
+from inventory import claim_seat_numbers, begin_savepoint, SeatUnavailableError
+
+
+def _free_runs(row_occupancy):
+    """Yield (row_index, [(column, seat_number), ...]) for every run of adjacent free seats."""
+    for row_index, (_, seats) in enumerate(row_occupancy):
+        run = []
+        for column, seat_number, is_free in seats:
+            if is_free and run and column == run[-1][0] + 1:
+                run.append((column, seat_number))
+                continue
+            if run:
+                yield row_index, run
+            run = [(column, seat_number)] if is_free else []
+        if run:
+            yield row_index, run
+
+
+def _best_slice(run, count, row_center):
+    """Pick the count adjacent seats of a run closest to the middle of the row."""
+    best = None
+    for start in range(len(run) - count + 1):
+        block = run[start:start + count]
+        offset = abs((block[0][0] + block[-1][0]) / 2 - row_center)
+        if best is None or offset < best[0]:
+            best = (offset, block)
+    return best
+
+
+def best_available(row_occupancy, count):
+    """
+    Choose count seats from a showtime's row-occupancy grid.
+
+    Prefers a single contiguous block in one row, scored by distance from the
+    middle row plus distance from the middle of that row. When no row has a
+    long enough run, the largest runs are split across rows instead.
+
+    :param row_occupancy: Output of SeatStore.row_occupancy
+    :param count: Number of seats wanted
+    :return: List of seat numbers, or None if fewer than count seats are free
+    """
+    if count <= 0:
+        return None
+
+    middle_row = (len(row_occupancy) - 1) / 2
+    row_centers = [
+        (seats[0][0] + seats[-1][0]) / 2 if seats else 0
+        for _, seats in row_occupancy
+    ]
+    runs = list(_free_runs(row_occupancy))
+    if sum(len(run) for _, run in runs) < count:
+        return None
+
+    best = None
+    for row_index, run in runs:
+        if len(run) < count:
+            continue
+        offset, block = _best_slice(run, count, row_centers[row_index])
+        score = abs(row_index - middle_row) + offset
+        if best is None or score < best[0]:
+            best = (score, block)
+    if best:
+        return [seat_number for _, seat_number in best[1]]
+
+    # No single row fits everyone: take from the longest runs, nearest the middle first.
+    runs.sort(key=lambda item: (-len(item[1]), abs(item[0] - middle_row)))
+    picked = []
+    for row_index, run in runs:
+        take = min(count - len(picked), len(run))
+        _, block = _best_slice(run, take, row_centers[row_index])
+        picked.extend(seat_number for _, seat_number in block)
+        if len(picked) == count:
+            break
+    return picked
+
+
+def claim_best_available(showtime_id, count, attempts=3):
+    """
+    Pick and claim count seats for a showtime.
+
+    The pick comes from the in-process seat store, which can lag behind other
+    workers, so each claim runs in a savepoint: a failed one is rolled back
+    on its own, leaving the caller's earlier writes in place, and the
+    showtime is reloaded before the next try.
+
+    :return: Set of claimed seat ids
+    :raises SeatUnavailableError: if not enough seats are free
+    """
+    for _ in range(attempts):
+        seat_numbers = best_available(seat_store.row_occupancy(showtime_id), count)
+        if seat_numbers is None:
+            raise SeatUnavailableError("Not enough seats available")
+        savepoint = begin_savepoint()
+        try:
+            seat_ids = claim_seat_numbers(showtime_id, seat_numbers)
+        except SeatUnavailableError:
+            savepoint.rollback()
+            seat_store.invalidate(showtime_id)
+            continue
+        savepoint.commit()
+        return seat_ids
+    raise SeatUnavailableError("Seats were taken while allocating, please try again")
@@ -1,9 +1,27 @@
-
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-from models import db, User, Movie, Showtime, Seat, Reservation, Admin ,Payment ,AdminReference
+from models import db, User, Movie, Showtime, Seat, Reservation, Admin ,Payment ,AdminReference, Auditorium, WaitlistEntry
+from seat_store import seat_store
+from events import seat_events, seats_changed, sync_seats, release_callbacks, change_callbacks
+from inventory import (claim_seats, claim_seat_numbers, create_holds, cancel_reservations,
+                       release_reservation_seats, delete_reservation_holds,
+                       insert_seats, create_auditorium, seat_numbers_for, recount_seat_counters,
+                       SeatUnavailableError)
+from layouts import expand_layout, parse_seat_number, MAX_LAYOUT_SEATS
+from recurrence import expand_recurrence
+from conflicts import hall_conflicts
+from allocation import claim_best_available
+from booking import (PAYMENT_METHODS, INITIAL_STATUSES, validate_item, validate_seats, create_bookings,
+                     settle_bookings)
+from idempotency import idempotent
+from waitlist import waitlist_promoter, waitlist_position
+from admission import admission, AdmissionError
+from schedule import schedule_cache
+from locks import seat_locks, LockTimeout
+from consistency import check_seat_consistency, FINDING_KINDS
+from sweeper import sweep_expired_holds, expire_reservations, expiry_metrics, ensure_hold_sweeper
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 from resend.emails._emails import Emails
 import resend
@@ -14,8 +32,17 @@ from datetime import timedelta, datetime
 from humanize import naturaltime
 from dotenv import load_dotenv
 import os
+import json
+import queue
+import threading
+import time
 import re  # For manual email validation
 import stripe  # Added stripe import for payment processing
+import click
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.orm.attributes import flag_modified
 
 # Load environment variables
 load_dotenv()
@@ -50,7 +77,7 @@ def process_stripe_payment(amount, payment_token):
         raise Exception(f"Stripe error: {str(e)}")
 
 # Configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///cinema.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///cinema.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
 app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(days=1095)  # 3 years expiry  
@@ -65,6 +92,31 @@ app.config['RESEND_API_KEY'] = os.getenv('RESEND_API_KEY')
 app.config['CLOUDINARY_CLOUD_NAME'] = os.getenv('CLOUDINARY_CLOUD_NAME')
 app.config['CLOUDINARY_API_KEY'] = os.getenv('CLOUDINARY_API_KEY')
 app.config['CLOUDINARY_API_SECRET'] = os.getenv('CLOUDINARY_API_SECRET')
+app.config['SEAT_HOLD_TTL_MINUTES'] = int(os.getenv('SEAT_HOLD_TTL_MINUTES', 15))  # How long held seats stay locked
+app.config['SEAT_HOLD_SWEEP_SECONDS'] = int(os.getenv('SEAT_HOLD_SWEEP_SECONDS', 30))  # 0 = no in-process sweeper
+app.config['RESERVATION_PAYMENT_TTL_MINUTES'] = int(os.getenv('RESERVATION_PAYMENT_TTL_MINUTES', 60))  # PayPal / cash reservations expire after this
+app.config['RESERVATION_EXPIRY_BATCH_SIZE'] = 500
+app.config['SEAT_EVENTS_QUEUE_SIZE'] = int(os.getenv('SEAT_EVENTS_QUEUE_SIZE', 100))  # Per SSE subscriber
+app.config['SEAT_EVENTS_KEEPALIVE_SECONDS'] = 15
+app.config['SEAT_EVENTS_POLL_SECONDS'] = int(os.getenv('SEAT_EVENTS_POLL_SECONDS', 2))  # How often SSE streams look for other workers' changes
+app.config['IDEMPOTENCY_KEY_TTL_HOURS'] = int(os.getenv('IDEMPOTENCY_KEY_TTL_HOURS', 24))  # How long responses are replayable
+app.config['IDEMPOTENCY_LOCK_SECONDS'] = 120  # After this an unfinished request's key can be retried
+app.config['RESERVATION_LATENCY_BUDGET_MS'] = int(os.getenv('RESERVATION_LATENCY_BUDGET_MS', 100))  # Excludes the Stripe call
+app.config['CHECKOUT_MAX_ITEMS'] = 10
+app.config['SEATS_MAX_SHOWTIMES'] = 100  # Showtimes one POST /seats request may add seats to
+app.config['SHOWTIME_SEARCH_MAX_DAYS'] = 31
+app.config['SCHEDULE_MAX_DAYS'] = 14
+app.config['SCHEDULE_WINDOW_DAYS'] = 366  # How far from today GET /schedule may start
+app.config['SCHEDULE_CACHE_DAYS'] = 64  # Days the schedule cache keeps; must cover SCHEDULE_MAX_DAYS
+app.config['RECURRING_SHOWTIMES_MAX'] = 1000  # Showtimes one recurrence request may create
+app.config['SCHEDULE_CACHE_SECONDS'] = int(os.getenv('SCHEDULE_CACHE_SECONDS', 60))  # Bounds lag behind other workers
+app.config['ADMISSION_WINDOW_SECONDS'] = int(os.getenv('ADMISSION_WINDOW_SECONDS', 300))  # Time an admitted user has to book
+app.config['ADMISSION_CEILING_CACHE_SECONDS'] = 5
+app.config['ADMISSION_TICKET_TTL_HOURS'] = 24
+app.config['SEAT_LOCK_DIR'] = os.getenv('SEAT_LOCK_DIR', os.path.join(app.instance_path, 'locks'))  # Shared by all workers on the host
+app.config['SEAT_LOCK_STRIPES'] = int(os.getenv('SEAT_LOCK_STRIPES', 64))
+app.config['SEAT_LOCK_TIMEOUT_SECONDS'] = float(os.getenv('SEAT_LOCK_TIMEOUT_SECONDS', 5))
+SEAT_PRICE = 10.00  # Default seat price
 
 # Limit upload size and allowed extensions
 app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB max
@@ -72,8 +124,9 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
 # Initialize extensions
 db.init_app(app)
-migrate = Migrate(app, db)
+migrate = Migrate(app, db, render_as_batch=True)  # SQLite can only alter tables by copying them
 jwt = JWTManager(app)
+seat_events.max_queue = app.config['SEAT_EVENTS_QUEUE_SIZE']
 
 # Configure Cloudinary
 cloudinary.config(
@@ -112,6 +165,12 @@ def bad_request(error):
 def internal_server_error(error):
     return jsonify({"message": "Internal server error"}), 500
 
+# A versioned row (movie, showtime, seat, reservation) changed since it was read
+@app.errorhandler(StaleDataError)
+def version_conflict(error=None):
+    db.session.rollback()
+    return jsonify({"message": "This record was changed by another request. Reload it and try again"}), 409
+
 # Initialize Resend client
 resend.api_key = os.getenv("RESEND_API_KEY")
 emails = Emails()
@@ -129,15 +188,80 @@ def send_email(to_email, subject, content):
     except Exception as e:
         return str(e)
 
+def send_email_async(to_email, subject, content):
+    """Send an email on a background thread so the request doesn't wait on Resend."""
+    threading.Thread(target=send_email, args=(to_email, subject, content), daemon=True).start()
+
 def validate_email(email):
     """Validate email format using regex."""
     if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
         return False
     return True
 
+def version_mismatch(record, data):
+    """Return True if the client sent a 'version' that is not the record's current version_id."""
+    return 'version' in data and data['version'] != record.version_id
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def hold_expiry(payment_method=None):
+    """Expiry timestamp for seat holds created now.
+
+    Holds of PayPal and cash reservations last for the whole payment window, so
+    RESERVATION_PAYMENT_TTL_MINUTES is the only clock those reservations run on.
+    """
+    if payment_method in ('paypal', 'cash'):
+        return datetime.utcnow() + timedelta(minutes=app.config['RESERVATION_PAYMENT_TTL_MINUTES'])
+    return datetime.utcnow() + timedelta(minutes=app.config['SEAT_HOLD_TTL_MINUTES'])
+
+def notify_waitlist_promotion(user_id, showtime_id, seat_numbers, expires_at):
+    user = db.session.get(User, user_id)
+    movie_title = db.session.query(Movie.title).join(Showtime, Showtime.movie_id == Movie.id) \
+        .filter(Showtime.id == showtime_id).scalar()
+    content = (
+        f"Hello {user.username},\n\n"
+        f"Seats opened up for '{movie_title}'. We are holding {', '.join(seat_numbers)} for you "
+        f"until {expires_at.strftime('%H:%M')} UTC.\n"
+        "Book them with POST /reservations before the hold runs out.\n\n"
+        "Thank you for choosing our cinema!"
+    )
+    send_email_async(user.email, "Seats available from the waitlist", content)
+
+# Promote waitlisted users whenever seats are released
+waitlist_promoter.init_app(app, hold_expiry, notify_waitlist_promotion)
+release_callbacks.append(waitlist_promoter.request_promotion)
+
+# Keep the cached schedule grid's availability in step with seat changes
+schedule_cache.max_age = app.config['SCHEDULE_CACHE_SECONDS']
+schedule_cache.max_days = app.config['SCHEDULE_CACHE_DAYS']
+change_callbacks.append(schedule_cache.seats_changed)
+
+# Cross-worker locks around seat changes
+seat_locks.init_app(app)
+
+# Expire holds and unpaid reservations and purge old keys and tickets in the background,
+# one sweeper per serving process (started by its first request, so CLI commands don't)
+@app.before_request
+def start_background_sweeper():
+    ensure_hold_sweeper(app)
+
+def seat_lock_busy():
+    response = jsonify({"message": "Seats for this showtime are busy, please try again"})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+# Waiting room in front of the booking endpoints for showtimes with an admission ceiling
+admission.init_app(app)
+
+def check_admission(user_id, showtime_ids):
+    """Return (error response or None, admission ticket ids) for the booking endpoints."""
+    error, ticket_ids = admission.verify(showtime_ids, user_id, request.headers.get('X-Admission-Token'))
+    if error:
+        return (jsonify({"message": error}), 403), []
+    return None, ticket_ids
+
 @app.route('/send-email', methods=['POST'])
 @jwt_required()
 def send_email_route():
@@ -290,6 +414,8 @@ def update_movie(movie_id):
 
     movie = Movie.query.get_or_404(movie_id)
     data = request.get_json()
+    if version_mismatch(movie, data):
+        return version_conflict()
 
     # Validation
     if 'title' in data and len(data['title']) > 200:
@@ -311,8 +437,9 @@ def update_movie(movie_id):
     movie.release_date = data.get('release_date', movie.release_date)
 
     db.session.commit()
+    schedule_cache.clear()  # Titles are cached in the schedule grid
 
-    return jsonify({"message": "Movie updated successfully"}), 200
+    return jsonify({"message": "Movie updated successfully", "version": movie.version_id}), 200
 
 # Delete a movie (Admin only)
 @app.route('/movies/<int:movie_id>', methods=['DELETE'])
@@ -327,6 +454,7 @@ def delete_movie(movie_id):
     movie = Movie.query.get_or_404(movie_id)
     db.session.delete(movie)
     db.session.commit()
+    schedule_cache.clear()
 
     return jsonify({"message": "Movie deleted successfully"}), 200
 
@@ -411,6 +539,41 @@ def upload_poster():
         app.logger.error(f"Cloudinary upload failed: {str(e)}")
         return jsonify({"message": "File upload failed", "error": str(e)}), 500
     
+# Create an auditorium with its seat template (Admin only)
+@app.route('/auditoriums', methods=['POST'])
+@jwt_required()
+def create_auditorium_route():
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+
+    if user.role != 'admin':
+        return jsonify({"message": "Admin access required"}), 403
+
+    data = request.get_json()
+    name = data.get('name')
+    layout = data.get('layout')  # Same format as POST /seats layouts
+
+    if not all([name, layout]):
+        return jsonify({"message": "Missing required fields"}), 400
+    if len(name) > 100:
+        return jsonify({"message": "Name must be <= 100 characters"}), 400
+    if Auditorium.query.filter_by(name=name).first():
+        return jsonify({"message": "Auditorium already exists"}), 400
+
+    try:
+        positions = expand_layout(layout)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    auditorium = create_auditorium(name, positions)
+    db.session.commit()
+
+    return jsonify({
+        "message": "Auditorium created successfully",
+        "auditorium_id": auditorium.id,
+        "capacity": auditorium.capacity
+    }), 201
+
 # Create a showtime (Admin only)
 @app.route('/showtimes', methods=['POST'])
 @jwt_required()
@@ -425,21 +588,37 @@ def create_showtime():
     movie_id = data.get('movie_id')
     start_time = data.get('start_time')
     duration = data.get('duration')
+    auditorium_id = data.get('auditorium_id')  # Optional: use the auditorium's seat template
 
     if not all([movie_id, start_time, duration]):
         return jsonify({"message": "Missing required fields"}), 400
+    if not isinstance(duration, int) or isinstance(duration, bool) or duration < 1:
+        return jsonify({"message": "duration must be a positive number of minutes"}), 400
     try:
         start_time = datetime.strptime(start_time, '%Y-%m-%d %H:%M:%S')
     except ValueError:
         return jsonify({"message": "Invalid start time format. Use YYYY-MM-DD HH:MM:SS"}), 400
 
+    available_seats = 0
+    if auditorium_id:
+        auditorium = Auditorium.query.get(auditorium_id)
+        if not auditorium:
+            return jsonify({"message": "Auditorium not found"}), 404
+        available_seats = auditorium.capacity
+        conflicts = hall_conflicts(auditorium_id, [start_time], duration)
+        if conflicts:
+            return jsonify({"message": "The auditorium is already in use at that time", "conflicts": conflicts}), 409
+
     showtime = Showtime(
         movie_id=movie_id,
         start_time=start_time,
-        duration=duration
+        duration=duration,
+        auditorium_id=auditorium_id,
+        available_seats=available_seats
     )
     db.session.add(showtime)
     db.session.commit()
+    schedule_cache.showtime_created(showtime, db.session.query(Movie.title).filter(Movie.id == movie_id).scalar())
 
     return jsonify({
         "message": "Showtime created successfully", 
@@ -447,27 +626,195 @@ def create_showtime():
         "start_time": naturaltime(showtime.start_time)
     }), 201
 
+# Create a run of showtimes from a recurrence spec (Admin only)
+@app.route('/showtimes/recurring', methods=['POST'])
+@jwt_required()
+def create_recurring_showtimes():
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+
+    if user.role != 'admin':
+        return jsonify({"message": "Admin access required"}), 403
+
+    data = request.get_json()
+    movie_id = data.get('movie_id')
+    duration = data.get('duration')
+    auditorium_id = data.get('auditorium_id')  # Seats come from the hall's template
+    recurrence = data.get('recurrence')  # {"from", "to", "days_of_week", "times"}
+
+    if not all([movie_id, duration, auditorium_id, recurrence]):
+        return jsonify({"message": "Missing required fields"}), 400
+    if not isinstance(duration, int) or isinstance(duration, bool) or duration < 1:
+        return jsonify({"message": "duration must be a positive number of minutes"}), 400
+    try:
+        start_times = expand_recurrence(recurrence)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    if not start_times:
+        return jsonify({"message": "The recurrence does not produce any showtimes"}), 400
+    if len(start_times) > app.config['RECURRING_SHOWTIMES_MAX']:
+        return jsonify({"message": f"A recurrence can create at most {app.config['RECURRING_SHOWTIMES_MAX']} showtimes"}), 400
+
+    if not db.session.get(Movie, movie_id):
+        return jsonify({"message": "Movie not found"}), 404
+    auditorium = db.session.get(Auditorium, auditorium_id)
+    if not auditorium:
+        return jsonify({"message": "Auditorium not found"}), 404
+    conflicts = hall_conflicts(auditorium_id, start_times, duration)
+    if conflicts:
+        return jsonify({"message": "Some showtimes overlap others in the auditorium", "conflicts": conflicts}), 409
+
+    # One executemany INSERT for the whole run, returning ids in input order
+    showtime_ids = list(db.session.scalars(
+        insert(Showtime).returning(Showtime.id, sort_by_parameter_order=True),
+        [
+            {
+                "movie_id": movie_id,
+                "start_time": start_time,
+                "duration": duration,
+                "auditorium_id": auditorium_id,
+                "available_seats": auditorium.capacity
+            }
+            for start_time in start_times
+        ]
+    ))
+    db.session.commit()
+    schedule_cache.forget_days({start_time.date() for start_time in start_times})
+
+    return jsonify({
+        "message": "Showtimes created successfully",
+        "showtimes_created": len(showtime_ids),
+        "showtimes": [
+            {"showtime_id": showtime_id, "start_time": start_time.isoformat()}
+            for showtime_id, start_time in zip(showtime_ids, start_times)
+        ]
+    }), 201
+
 # Get movies and showtimes for a specific date
 @app.route('/showtimes/search', methods=['GET'])
 @jwt_required()
 def search_showtimes():
-    date = request.args.get('date')
-    if not date:
+    date = request.args.get('date')  # A single day, or a from/to window
+    window_from = request.args.get('from')
+    window_to = request.args.get('to')
+    movie_id = request.args.get('movie_id', type=int)
+    if not (date or window_from):
         return jsonify({"message": "Date parameter is required"}), 400
 
-    showtimes = Showtime.query.filter(Showtime.start_time.like(f"{date}%")).all()
+    # Half-open [start, end) range so the start_time index can be used
+    try:
+        if date:
+            start = datetime.strptime(date, '%Y-%m-%d')
+            end = start + timedelta(days=1)
+        else:
+            start = datetime.fromisoformat(window_from)
+            end = datetime.fromisoformat(window_to) if window_to else start + timedelta(days=1)
+    except (ValueError, OverflowError):  # 9999-12-31 parses, but the day after it doesn't exist
+        return jsonify({"message": "Invalid date format. Use YYYY-MM-DD or YYYY-MM-DD HH:MM:SS"}), 400
+    if end <= start:
+        return jsonify({"message": "'to' must be after 'from'"}), 400
+    if end - start > timedelta(days=app.config['SHOWTIME_SEARCH_MAX_DAYS']):
+        return jsonify({"message": f"Search windows are limited to {app.config['SHOWTIME_SEARCH_MAX_DAYS']} days"}), 400
+
+    # One statement, only the returned columns; availability is the counter kept in step with seat changes
+    query = select(Showtime.id, Movie.title, Showtime.start_time, Showtime.available_seats) \
+        .join(Movie, Showtime.movie_id == Movie.id) \
+        .where(Showtime.start_time >= start, Showtime.start_time < end)
+    if movie_id:
+        query = query.where(Showtime.movie_id == movie_id)
     formatted_showtimes = [
         {
-            "id": showtime.id,
-            "movie_title": showtime.movie.title,
-            "start_time": showtime.start_time.isoformat(),
-            "available_seats": len([seat for seat in showtime.seats if not seat.is_reserved])
+            "id": showtime_id,
+            "movie_title": title,
+            "start_time": start_time.isoformat(),
+            "available_seats": available_seats
         }
-        for showtime in showtimes
+        for showtime_id, title, start_time, available_seats in db.session.execute(query.order_by(Showtime.start_time))
     ]
 
     return jsonify(formatted_showtimes), 200
 
+# Week-at-a-glance schedule: showtimes grouped by movie and day
+@app.route('/schedule', methods=['GET'])
+@jwt_required()
+def schedule():
+    days = request.args.get('days', 7, type=int)
+    try:
+        first_day = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if 'from' in request.args \
+            else datetime.utcnow().date()
+    except ValueError:
+        return jsonify({"message": "Invalid date format. Use YYYY-MM-DD"}), 400
+    if not 1 <= days <= app.config['SCHEDULE_MAX_DAYS']:
+        return jsonify({"message": f"days must be between 1 and {app.config['SCHEDULE_MAX_DAYS']}"}), 400
+    # Also keeps first_day + days clear of date.max
+    if abs((first_day - datetime.utcnow().date()).days) > app.config['SCHEDULE_WINDOW_DAYS']:
+        return jsonify({"message": f"from must be within {app.config['SCHEDULE_WINDOW_DAYS']} days of today"}), 400
+
+    return jsonify({
+        "from": first_day.isoformat(),
+        "days": [(first_day + timedelta(days=n)).isoformat() for n in range(days)],
+        "movies": schedule_cache.grid(first_day, days)
+    }), 200
+
+# Compact seat map for a showtime, cheap to poll with If-None-Match
+@app.route('/showtimes/<int:showtime_id>/seatmap', methods=['GET'])
+@jwt_required()
+def showtime_seatmap(showtime_id):
+    encoding = request.args.get('encoding', 'bitstring')
+    if encoding not in ('bitstring', 'rle'):
+        return jsonify({"message": "encoding must be 'bitstring' or 'rle'"}), 400
+
+    etag, payload = seat_store.seatmap(showtime_id, encoding)
+    if not payload["capacity"] and not db.session.get(Showtime, showtime_id):
+        seat_store.invalidate(showtime_id)
+        return jsonify({"message": "Showtime not found"}), 404
+
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify({"showtime_id": showtime_id, **payload})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# Live seat changes for a showtime as Server-Sent Events
+@app.route('/showtimes/<int:showtime_id>/events', methods=['GET'])
+@jwt_required()
+def showtime_events(showtime_id):
+    if not db.session.get(Showtime, showtime_id):
+        return jsonify({"message": "Showtime not found"}), 404
+
+    # Tell the client which seat map the deltas apply to
+    etag, _ = seat_store.seatmap(showtime_id)
+    subscriber = seat_events.subscribe(showtime_id)
+    keepalive = app.config['SEAT_EVENTS_KEEPALIVE_SECONDS']
+    poll = min(keepalive, app.config['SEAT_EVENTS_POLL_SECONDS'])
+
+    def stream():
+        try:
+            yield f"event: hello\ndata: {json.dumps({'showtime_id': showtime_id, 'seatmap_etag': etag})}\n\n"
+            last_sent = time.monotonic()
+            while True:
+                try:
+                    event = subscriber.get(timeout=poll)
+                except queue.Empty:
+                    # Other workers' commits never reach this process's bus; check the database for them
+                    sync_seats(showtime_id)
+                    db.session.rollback()  # Don't keep a read transaction open between polls
+                    if time.monotonic() - last_sent >= keepalive:
+                        last_sent = time.monotonic()
+                        yield ": keep-alive\n\n"
+                    continue
+                last_sent = time.monotonic()
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            seat_events.unsubscribe(showtime_id, subscriber)
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Don't let proxies buffer the stream
+    })
+
 # Create seats for a showtime (Admin only)
 @app.route('/seats', methods=['POST'])
 @jwt_required()
@@ -479,61 +826,286 @@ def create_seats():
         return jsonify({"message": "Admin access required"}), 403
 
     data = request.get_json()
-    showtime_id = data.get('showtime_id')
+    showtime_ids = data.get('showtime_ids') or [data.get('showtime_id')]  # One showtime or many
     seat_numbers = data.get('seat_numbers')  # List of seat numbers (e.g., ['A1', 'A2'])
+    layout = data.get('layout')  # e.g. {"rows": 10, "columns": 20, "gaps": ["A1"]} or {"template": "standard"}
 
-    if not all([showtime_id, seat_numbers]):
+    if showtime_ids == [None] or not (seat_numbers or layout):
         return jsonify({"message": "Missing required fields"}), 400
+    if not isinstance(showtime_ids, list) or not all(
+        isinstance(showtime_id, int) and not isinstance(showtime_id, bool) for showtime_id in showtime_ids
+    ):
+        return jsonify({"message": "showtime_ids must be a non-empty list of showtime ids"}), 400
+    if len(showtime_ids) > app.config['SEATS_MAX_SHOWTIMES']:
+        return jsonify({"message": f"Seats can be added to at most {app.config['SEATS_MAX_SHOWTIMES']} showtimes at once"}), 400
+    if seat_numbers and (not isinstance(seat_numbers, list) or len(seat_numbers) > MAX_LAYOUT_SEATS):
+        return jsonify({"message": f"seat_numbers must be a list of at most {MAX_LAYOUT_SEATS} seat numbers"}), 400
 
-    seats = []
-    for seat_number in seat_numbers:
-        row, column = seat_number[0], int(seat_number[1:])
-        seat = Seat(
-            seat_number=seat_number,
-            row=row,
-            column=column,
-            showtime_id=showtime_id
-        )
-        seats.append(seat)
+    try:
+        if layout:
+            positions = expand_layout(layout)
+        else:
+            positions = [(seat_number, *parse_seat_number(seat_number)) for seat_number in seat_numbers]
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
 
-    db.session.add_all(seats)
-    db.session.commit()
+    showtime_ids = set(showtime_ids)
+    showtimes = Showtime.query.filter(Showtime.id.in_(showtime_ids)).all()
+    if len(showtimes) != len(showtime_ids):
+        return jsonify({"message": "Showtime not found"}), 404
+    if any(showtime.auditorium_id for showtime in showtimes):
+        return jsonify({"message": "Seats of auditorium showtimes come from the auditorium template"}), 400
+
+    try:
+        created = insert_seats(showtime_ids, positions)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"message": "One or more seats already exist for this showtime"}), 400
+
+    for showtime_id in showtime_ids:
+        seat_store.invalidate(showtime_id)
+
+    return jsonify({"message": "Seats created successfully", "seats_created": created}), 201
+
+def book_items(user_id, items, payment_method, payment_token, admission_tickets=()):
+    """
+    Shared booking path for POST /reservations and POST /checkout.
+
+    Claims and records every item in one short transaction, then charges the
+    card once for the whole order outside it and settles in a second one.
+    Waiting-room tickets are used up in the first transaction and given
+    back if the card is declined.
+    Returns (bookings, status, timings) or an error (response, status code).
+    """
+    started = time.perf_counter()
+    try:
+        bookings = create_bookings(user_id, items, payment_method, SEAT_PRICE, hold_expiry(payment_method))
+        admission.complete(admission_tickets)
+        db.session.commit()
+    except SeatUnavailableError as e:
+        db.session.rollback()
+        return None, (jsonify({"message": str(e)}), 400), None
+    except AdmissionError as e:
+        db.session.rollback()
+        return None, (jsonify({"message": str(e)}), 403), None
+
+    for booking in bookings:
+        seats_changed(booking["showtime_id"], claimed=booking["seat_numbers"])
+    status = INITIAL_STATUSES[payment_method][0]
+    db_ms = (time.perf_counter() - started) * 1000
+    payment_ms = 0.0
+
+    # Charge outside the transaction so the seat locks aren't held during the Stripe call
+    if payment_method == 'credit_card':
+        total_amount = sum(booking["amount"] for booking in bookings)
+        payment_started = time.perf_counter()
+        try:
+            process_stripe_payment(total_amount, payment_token)
+            paid, error = True, None
+        except Exception as e:
+            paid, error = False, str(e)
+        payment_ms = (time.perf_counter() - payment_started) * 1000
+
+        settle_started = time.perf_counter()
+        status = settle_bookings(bookings, paid)
+        if not paid:
+            admission.reopen(admission_tickets)
+        db.session.commit()
+        db_ms += (time.perf_counter() - settle_started) * 1000
+
+        if not paid:
+            for booking in bookings:
+                seats_changed(booking["showtime_id"], released=booking["seat_numbers"])
+            return None, (jsonify({"message": f"Credit card payment failed: {error}"}), 400), None
+
+    if db_ms > app.config['RESERVATION_LATENCY_BUDGET_MS']:
+        app.logger.warning(f"Booking {[booking['reservation_id'] for booking in bookings]} took {db_ms:.1f}ms, "
+                           f"over the {app.config['RESERVATION_LATENCY_BUDGET_MS']}ms budget")
+
+    if status == 'confirmed':
+        send_booking_confirmation(user_id, bookings)
 
-    return jsonify({"message": "Seats created successfully"}), 201
+    return bookings, status, f"db;dur={db_ms:.1f}, payment;dur={payment_ms:.1f}"
 
-# Create Reservation
+def send_booking_confirmation(user_id, bookings):
+    user = db.session.get(User, user_id)
+    showtimes = dict(
+        (showtime_id, (title, start_time))
+        for showtime_id, title, start_time in db.session.query(Showtime.id, Movie.title, Showtime.start_time)
+        .join(Movie, Showtime.movie_id == Movie.id)
+        .filter(Showtime.id.in_([booking["showtime_id"] for booking in bookings]))
+    )
+    lines = []
+    for booking in bookings:
+        title, start_time = showtimes[booking["showtime_id"]]
+        lines.append(f"'{title}' on {start_time.strftime('%Y-%m-%d %H:%M')} - Seats: {', '.join(booking['seat_numbers'])}")
+    total_amount = sum(booking["amount"] for booking in bookings)
+    content = (
+        f"Hello {user.username},\n\n"
+        "Your booking is confirmed:\n"
+        + "\n".join(lines) +
+        f"\nAmount paid: ${total_amount:.2f}\n\n"
+        "Enjoy your movie!"
+    )
+    send_email_async(user.email, "Reservation Confirmation", content)
+
+def validate_payment(payment_method, payment_token):
+    if payment_method not in PAYMENT_METHODS:
+        return "Unsupported payment method"
+    if payment_method == 'credit_card' and not payment_token:
+        return "payment_token is required for credit card payments"
+    return None
+
+# Create a reservation
+@app.route('/reservations', methods=['POST'])
+@jwt_required()
+@idempotent
+def create_reservation():
+    data = request.get_json()
+    user_id = get_jwt_identity()
+    payment_method = data.get('payment_method', 'credit_card')
+    payment_token = data.get('payment_token')
+    item = {key: data.get(key) for key in ('showtime_id', 'seat_ids', 'seat_numbers', 'seat_count')}
+
+    # Validate required fields
+    if not item['showtime_id'] or not (item['seat_ids'] or item['seat_numbers'] or item['seat_count']):
+        return jsonify({"message": "Missing required fields"}), 400
+    error = validate_item(item) or validate_payment(payment_method, payment_token)
+    if error:
+        return jsonify({"message": error}), 400
+    denied, admission_tickets = check_admission(user_id, [item['showtime_id']])
+    if denied:
+        return denied
+
+    bookings, status, timing = book_items(user_id, [item], payment_method, payment_token, admission_tickets)
+    if bookings is None:
+        return status
+
+    booking = bookings[0]
+    response = jsonify({
+        "message": "Reservation confirmed" if status == 'confirmed' else "Payment processing required",
+        "reservation_id": booking["reservation_id"],
+        "showtime_id": booking["showtime_id"],
+        "status": status,
+        "payment_status": 'completed' if status == 'confirmed' else INITIAL_STATUSES[payment_method][1],
+        "seats": booking["seat_numbers"],
+        "total_amount": booking["amount"]
+    })
+    response.status_code = 201 if status == 'confirmed' else 202
+    response.headers['Server-Timing'] = timing
+    return response
+
+# Book seats for several showtimes and pay once
+@app.route('/checkout', methods=['POST'])
+@jwt_required()
+@idempotent
+def checkout():
+    data = request.get_json()
+    user_id = get_jwt_identity()
+    items = data.get('items')
+    payment_method = data.get('payment_method', 'credit_card')
+    payment_token = data.get('payment_token')
+
+    if not items or not isinstance(items, list):
+        return jsonify({"message": "Missing required fields"}), 400
+    if len(items) > app.config['CHECKOUT_MAX_ITEMS']:
+        return jsonify({"message": f"A cart can hold at most {app.config['CHECKOUT_MAX_ITEMS']} items"}), 400
+    error = next(filter(None, map(validate_item, items)), None) or validate_payment(payment_method, payment_token)
+    if error:
+        return jsonify({"message": error}), 400
+    denied, admission_tickets = check_admission(user_id, [item['showtime_id'] for item in items])
+    if denied:
+        return denied
+
+    bookings, status, timing = book_items(user_id, items, payment_method, payment_token, admission_tickets)
+    if bookings is None:
+        return status
+
+    response = jsonify({
+        "message": "Checkout complete" if status == 'confirmed' else "Payment processing required",
+        "status": status,
+        "reservations": [
+            {
+                "reservation_id": booking["reservation_id"],
+                "showtime_id": booking["showtime_id"],
+                "seats": booking["seat_numbers"],
+                "amount": booking["amount"]
+            }
+            for booking in bookings
+        ],
+        "total_amount": sum(booking["amount"] for booking in bookings)
+    })
+    response.status_code = 201 if status == 'confirmed' else 202
+    response.headers['Server-Timing'] = timing
+    return response
+
+# Update a reservation
 @app.route('/reservations/<int:reservation_id>', methods=['PUT'])
 @jwt_required()
+@idempotent
 def update_reservation(reservation_id):
     data = request.get_json()
     user_id = get_jwt_identity()
     showtime_id = data.get('showtime_id')
     seat_ids = data.get('seat_ids')
+    seat_numbers = data.get('seat_numbers')  # e.g. ['C7', 'C8']; required for auditorium showtimes
+    seat_count = data.get('seat_count')  # Let the server pick the best seats instead of seat_ids
     payment_method = data.get('payment_method', 'credit_card')  # Default payment method
 
     # Validate required fields
-    if not all([showtime_id, seat_ids]):
+    if not showtime_id or not (seat_ids or seat_numbers or seat_count):
         return jsonify({"message": "Missing required fields"}), 400
+    if not isinstance(showtime_id, int) or isinstance(showtime_id, bool):
+        return jsonify({"message": "showtime_id must be an integer"}), 400
+    if not (seat_ids or seat_numbers) and (not isinstance(seat_count, int) or seat_count < 1):
+        return jsonify({"message": "seat_count must be a positive integer"}), 400
+    error = validate_seats(seat_ids, seat_numbers) or validate_payment(payment_method, data.get('payment_token'))
+    if error:
+        return jsonify({"message": error}), 400
+    denied, admission_tickets = check_admission(user_id, [showtime_id])
+    if denied:
+        return denied
 
     # Fetch the existing reservation
     reservation = Reservation.query.filter_by(id=reservation_id, user_id=user_id).first()
     if not reservation:
         return jsonify({"message": "Reservation not found"}), 404
+    if version_mismatch(reservation, data):
+        return version_conflict()
 
-    # Validate seats availability
-    seats = Seat.query.filter(Seat.id.in_(seat_ids), Seat.is_reserved == False).all()
-    if len(seats) != len(seat_ids):
-        return jsonify({"message": "One or more seats are already reserved"}), 400
-
-    # Calculate total amount
-    seat_price = 10.00  # Default seat price
-    total_amount = len(seats) * seat_price
+    # Serialize seat changes to both showtimes across workers before touching the database
+    try:
+        seat_lock = seat_locks.acquire(reservation.showtime_id, showtime_id)
+    except LockTimeout:
+        return seat_lock_busy()
 
     # Start transaction
     try:
+        # Use up the waiting-room ticket first; a failed update rolls it back with everything else
+        admission.complete(admission_tickets)
+
+        # Claim seats in one conditional UPDATE so concurrent requests cannot double-book
+        if seat_ids:
+            seat_ids = claim_seats(showtime_id, seat_ids, user_id=user_id)
+        elif seat_numbers:
+            seat_ids = claim_seat_numbers(showtime_id, seat_numbers, user_id=user_id)
+        else:
+            seat_ids = claim_best_available(showtime_id, seat_count)
+
+        # Calculate total amount
+        total_amount = len(seat_ids) * SEAT_PRICE
+
+        seats = Seat.query.filter(Seat.id.in_(seat_ids)).all()
+
+        # Give back the seats (and holds) the reservation had before the move
+        previous_seats = release_reservation_seats([reservation.id])
+        delete_reservation_holds([reservation.id])
+
         # Update reservation details
         reservation.showtime_id = showtime_id
         reservation.seats = seats  # Update seats
+        flag_modified(reservation, 'status')  # Seat-only moves must still bump (and check) the version
         db.session.add(reservation)
         db.session.flush()  # Get reservation ID for payment
 
@@ -544,68 +1116,245 @@ def update_reservation(reservation_id):
         payment.status = 'pending'  # Reset status for new payment processing
         db.session.add(payment)
 
-        # Process payment based on method
+        # Process payment based on method; cards are charged below, after the commit
         if payment_method == 'credit_card':
-            try:
-                charge = process_stripe_payment(total_amount, data.get('payment_token'))
-                payment.status = 'completed'
-                payment.transaction_id = charge.id
-                reservation.status = 'confirmed'
-            except Exception as e:
-                raise Exception(f"Credit card payment failed: {str(e)}")
+            reservation.status = 'pending'  # Settled right after the Stripe charge
+            create_holds(showtime_id, seat_ids, user_id, hold_expiry(payment_method), reservation.id)
 
         elif payment_method == 'paypal':
             payment.status = 'processing'
             reservation.status = 'awaiting_payment'
+            reservation.timestamp = datetime.utcnow()  # Restart the payment expiry clock
+            create_holds(showtime_id, seat_ids, user_id, hold_expiry(payment_method), reservation.id)
 
         elif payment_method == 'cash':
             payment.status = 'pending'
             reservation.status = 'awaiting_verification'
+            reservation.timestamp = datetime.utcnow()
+            create_holds(showtime_id, seat_ids, user_id, hold_expiry(payment_method), reservation.id)
 
         else:
             raise Exception("Unsupported payment method")
 
-        # Mark seats as reserved
-        for seat in seats:
-            seat.is_reserved = True
+        db.session.commit()
+
+    except SeatUnavailableError as e:
+        db.session.rollback()
+        return jsonify({
+            "message": str(e),
+            "waitlist": f"/showtimes/{showtime_id}/waitlist"  # Queue for freed seats instead of retrying
+        }), 400
+
+    except AdmissionError as e:
+        db.session.rollback()
+        return jsonify({"message": str(e)}), 403
+
+    except StaleDataError:
+        return version_conflict()
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": f"Reservation update failed: {str(e)}"}), 400
+
+    finally:
+        seat_lock.release()
 
+    seat_numbers = [seat.seat_number for seat in seats]
+    for previous_showtime_id, previous_numbers in previous_seats.items():
+        seats_changed(previous_showtime_id, released=previous_numbers)
+    seats_changed(showtime_id, claimed=seat_numbers)
+
+    # Charge outside the transaction so the seat locks aren't held during the Stripe call,
+    # then settle like a new booking: confirmed, or the new seats are released
+    if payment_method == 'credit_card':
+        try:
+            process_stripe_payment(total_amount, data.get('payment_token'))
+            paid, error = True, None
+        except Exception as e:
+            paid, error = False, str(e)
+        settle_bookings([{"reservation_id": reservation.id, "showtime_id": showtime_id, "seat_ids": seat_ids}], paid)
+        if not paid:
+            admission.reopen(admission_tickets)
         db.session.commit()
 
-        # Prepare response data
-        response_data = {
-            "message": "Reservation updated successfully",
-            "reservation_id": reservation.id,
-            "payment_status": payment.status,
-            "seats": [seat.seat_number for seat in seats],
-            "total_amount": total_amount
-        }
+        if not paid:
+            seats_changed(showtime_id, released=seat_numbers)
+            return jsonify({"message": f"Reservation update failed: Credit card payment failed: {error}"}), 400
+
+    # Prepare response data
+    response_data = {
+        "message": "Reservation updated successfully",
+        "reservation_id": reservation.id,
+        "version": reservation.version_id,
+        "payment_status": payment.status,
+        "seats": seat_numbers,
+        "total_amount": total_amount
+    }
 
-        # Send confirmation email if payment completed
-        if payment.status == 'completed':
-            user = User.query.get(user_id)
-            showtime = Showtime.query.get(showtime_id)
-            movie = showtime.movie
+    # Send confirmation email if payment completed
+    if payment.status == 'completed':
+        user = User.query.get(user_id)
+        showtime = Showtime.query.get(showtime_id)
+        movie = showtime.movie
+
+        content = (
+            f"Hello {user.username},\n\n"
+            f"Your reservation for '{movie.title}' on {showtime.start_time.strftime('%Y-%m-%d %H:%M')} has been updated.\n"
+            f"Seats: {', '.join(seat_numbers)}\n"
+            f"Amount paid: ${total_amount:.2f}\n"
+            f"Payment method: {payment_method}\n\n"
+            "Thank you for choosing our cinema!"
+        )
+        send_email_async(user.email, "Reservation Update Confirmation", content)
 
-            content = (
-                f"Hello {user.username},\n\n"
-                f"Your reservation for '{movie.title}' on {showtime.start_time.strftime('%Y-%m-%d %H:%M')} has been updated.\n"
-                f"Seats: {', '.join([seat.seat_number for seat in seats])}\n"
-                f"Amount paid: ${total_amount:.2f}\n"
-                f"Payment method: {payment_method}\n\n"
-                "Thank you for choosing our cinema!"
-            )
-            send_email(user.email, "Reservation Update Confirmation", content)
+        return jsonify(response_data), 200
 
-            return jsonify(response_data), 200
+    # Different response for pending payments
+    response_data["message"] = "Payment processing required"
+    return jsonify(response_data), 202
 
-        # Different response for pending payments
-        response_data["message"] = "Payment processing required"
-        return jsonify(response_data), 202
 
-    except Exception as e:
+# Turn the waiting room of a showtime on or off (Admin only)
+@app.route('/showtimes/<int:showtime_id>/admission', methods=['PUT'])
+@jwt_required()
+def set_admission_ceiling(showtime_id):
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+
+    if user.role != 'admin':
+        return jsonify({"message": "Admin access required"}), 403
+
+    showtime = Showtime.query.get(showtime_id)
+    if not showtime:
+        return jsonify({"message": "Showtime not found"}), 404
+
+    ceiling = request.get_json().get('ceiling')  # null switches the waiting room off
+    if ceiling is not None and (not isinstance(ceiling, int) or ceiling < 1):
+        return jsonify({"message": "ceiling must be a positive integer or null"}), 400
+
+    showtime.admission_ceiling = ceiling
+    db.session.commit()
+    admission.forget_ceiling(showtime_id)
+    return jsonify({"message": "Admission ceiling updated", "showtime_id": showtime_id, "ceiling": ceiling}), 200
+
+# Join the waiting room of a showtime
+@app.route('/showtimes/<int:showtime_id>/queue', methods=['POST'])
+@jwt_required()
+def join_queue(showtime_id):
+    user_id = get_jwt_identity()
+    if not db.session.get(Showtime, showtime_id):
+        return jsonify({"message": "Showtime not found"}), 404
+
+    ticket = admission.join(showtime_id, user_id)
+    db.session.commit()
+    return jsonify({"ticket_id": ticket.id, **admission.poll(ticket)}), 201
+
+# Poll the waiting room: position and ETA, or the admission token once admitted
+@app.route('/showtimes/<int:showtime_id>/queue', methods=['GET'])
+@jwt_required()
+def queue_status(showtime_id):
+    user_id = get_jwt_identity()
+    ticket = admission.ticket_for(showtime_id, user_id)
+    if not ticket:
+        return jsonify({"message": "You are not in the queue for this showtime"}), 404
+    return jsonify({"ticket_id": ticket.id, **admission.poll(ticket)}), 200
+
+# Hold seats while the user completes checkout
+@app.route('/holds', methods=['POST'])
+@jwt_required()
+def create_seat_holds():
+    data = request.get_json()
+    user_id = get_jwt_identity()
+    showtime_id = data.get('showtime_id')
+    seat_ids = data.get('seat_ids')
+    seat_numbers = data.get('seat_numbers')
+
+    if not showtime_id or not (seat_ids or seat_numbers):
+        return jsonify({"message": "Missing required fields"}), 400
+    error = validate_seats(seat_ids, seat_numbers)
+    if error:
+        return jsonify({"message": error}), 400
+
+    expires_at = hold_expiry()
+    try:
+        if seat_ids:
+            seat_ids = claim_seats(showtime_id, seat_ids, user_id=user_id)
+        else:
+            seat_ids = claim_seat_numbers(showtime_id, seat_numbers, user_id=user_id)
+        create_holds(showtime_id, seat_ids, user_id, expires_at)
+        seat_numbers = seat_numbers_for(seat_ids)
+        db.session.commit()
+    except SeatUnavailableError as e:
         db.session.rollback()
-        return jsonify({"message": f"Reservation update failed: {str(e)}"}), 400
+        return jsonify({"message": str(e)}), 400
+
+    seats_changed(showtime_id, claimed=seat_numbers)
+
+    return jsonify({
+        "message": "Seats held successfully",
+        "seat_ids": sorted(seat_ids),
+        "seat_numbers": sorted(seat_numbers),
+        "expires_at": expires_at.isoformat()
+    }), 201
+
+# Join the waitlist of a sold-out showtime
+@app.route('/showtimes/<int:showtime_id>/waitlist', methods=['POST'])
+@jwt_required()
+def join_waitlist(showtime_id):
+    user_id = get_jwt_identity()
+    data = request.get_json()
+    seat_count = data.get('seat_count')
+
+    if not isinstance(seat_count, int) or seat_count < 1:
+        return jsonify({"message": "seat_count must be a positive integer"}), 400
+    if not db.session.get(Showtime, showtime_id):
+        return jsonify({"message": "Showtime not found"}), 404
+    if WaitlistEntry.query.filter_by(showtime_id=showtime_id, user_id=user_id, status='waiting').first():
+        return jsonify({"message": "Already on the waitlist for this showtime"}), 400
+
+    entry = WaitlistEntry(showtime_id=showtime_id, user_id=user_id, seat_count=seat_count)
+    db.session.add(entry)
+    db.session.commit()
 
+    # Seats may already be free (e.g. released while the client was retrying)
+    waitlist_promoter.request_promotion(showtime_id)
+
+    return jsonify({
+        "message": "Added to the waitlist",
+        "entry_id": entry.id,
+        "position": waitlist_position(entry)
+    }), 201
+
+# Waitlist position of the current user
+@app.route('/showtimes/<int:showtime_id>/waitlist', methods=['GET'])
+@jwt_required()
+def get_waitlist_position(showtime_id):
+    user_id = get_jwt_identity()
+    entry = WaitlistEntry.query.filter_by(showtime_id=showtime_id, user_id=user_id) \
+        .order_by(WaitlistEntry.id.desc()).first()
+    if not entry:
+        return jsonify({"message": "Not on the waitlist for this showtime"}), 404
+
+    return jsonify({
+        "entry_id": entry.id,
+        "status": entry.status,
+        "seat_count": entry.seat_count,
+        "position": waitlist_position(entry) if entry.status == 'waiting' else None
+    }), 200
+
+# Leave the waitlist
+@app.route('/showtimes/<int:showtime_id>/waitlist', methods=['DELETE'])
+@jwt_required()
+def leave_waitlist(showtime_id):
+    user_id = get_jwt_identity()
+    entry = WaitlistEntry.query.filter_by(showtime_id=showtime_id, user_id=user_id, status='waiting').first()
+    if not entry:
+        return jsonify({"message": "Not on the waitlist for this showtime"}), 404
+
+    entry.status = 'left'
+    db.session.commit()
+
+    return jsonify({"message": "Removed from the waitlist"}), 200
 
 # Cancel a reservation (User only)
 @app.route('/reservations/<int:reservation_id>', methods=['DELETE'])
@@ -620,15 +1369,61 @@ def cancel_reservation(reservation_id):
     if reservation.timestamp < datetime.utcnow():
         return jsonify({"message": "Cannot cancel past reservations"}), 400
 
-    # Mark seats as unreserved
-    for seat in reservation.seats:
-        seat.is_reserved = False
-
-    db.session.delete(reservation)
-    db.session.commit()
+    # Free the seats through reservation_seats and delete the reservation, one statement per table
+    try:
+        with seat_locks.lock(reservation.showtime_id):
+            _, released = cancel_reservations([reservation.id])
+            db.session.commit()
+    except LockTimeout:
+        db.session.rollback()
+        return seat_lock_busy()
+    for showtime_id, seat_numbers in released.items():
+        seats_changed(showtime_id, released=seat_numbers)
 
     return jsonify({"message": "Reservation cancelled successfully"}), 200
 
+# Cancel many reservations at once, e.g. every booking of a cancelled showtime (Admin only)
+@app.route('/admin/reservations/cancel', methods=['POST'])
+@jwt_required()
+def admin_cancel_reservations():
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+
+    if user.role != 'admin':
+        return jsonify({"message": "Admin access required"}), 403
+
+    data = request.get_json()
+    showtime_id = data.get('showtime_id')
+    reservation_ids = data.get('reservation_ids')
+
+    if showtime_id:
+        if not db.session.get(Showtime, showtime_id):
+            return jsonify({"message": "Showtime not found"}), 404
+        reservation_ids = select(Reservation.id).where(Reservation.showtime_id == showtime_id)
+        showtime_ids = [showtime_id]
+    elif isinstance(reservation_ids, list) and reservation_ids:
+        showtime_ids = list(db.session.scalars(
+            select(Reservation.showtime_id).where(Reservation.id.in_(reservation_ids)).distinct()
+        ))
+    else:
+        return jsonify({"message": "Provide a showtime_id or a list of reservation_ids"}), 400
+
+    try:
+        with seat_locks.lock(*showtime_ids):
+            cancelled, released = cancel_reservations(reservation_ids)
+            db.session.commit()
+    except LockTimeout:
+        db.session.rollback()
+        return seat_lock_busy()
+    for released_showtime_id, seat_numbers in released.items():
+        seats_changed(released_showtime_id, released=seat_numbers)
+
+    return jsonify({
+        "message": "Reservations cancelled successfully",
+        "reservations_cancelled": cancelled,
+        "seats_released": sum(len(seat_numbers) for seat_numbers in released.values())
+    }), 200
+
 # Admin reporting: All reservations, capacity, and revenue
 @app.route('/admin/report', methods=['GET'])
 @jwt_required()
@@ -651,6 +1446,30 @@ def admin_report():
 
     return jsonify(report), 200
 
+# Seat lock metrics of this worker (Admin only)
+@app.route('/admin/seat-locks', methods=['GET'])
+@jwt_required()
+def seat_lock_stats():
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+
+    if user.role != 'admin':
+        return jsonify({"message": "Admin access required"}), 403
+
+    return jsonify(seat_locks.stats()), 200
+
+# Reservation expiry job metrics of this worker (Admin only)
+@app.route('/admin/reservation-expiry', methods=['GET'])
+@jwt_required()
+def reservation_expiry_stats():
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+
+    if user.role != 'admin':
+        return jsonify({"message": "Admin access required"}), 403
+
+    return jsonify({**expiry_metrics, "ttl_minutes": app.config['RESERVATION_PAYMENT_TTL_MINUTES']}), 200
+
 # Admin view of all reservations
 @app.route('/admin/reservations', methods=['GET'])
 @jwt_required()
@@ -690,16 +1509,74 @@ def index():
         <li>PUT /movies/<movie_id> - Update a movie (admin only)</li>
         <li>DELETE /movies/<movie_id> - Delete a movie (admin only)</li>
         <li>GET /movies/search - Search movies by genre/title (requires JWT)</li>
+        <li>POST /auditoriums - Create an auditorium seat template (admin only)</li>
         <li>POST /showtimes - Create a showtime (admin only)</li>
-        <li>GET /showtimes/search - Search showtimes by date (requires JWT)</li>
+        <li>POST /showtimes/recurring - Create a run of showtimes from a recurrence spec (admin only)</li>
+        <li>GET /schedule?from=YYYY-MM-DD&days=7 - Showtimes grouped by movie and day (requires JWT)</li>
+        <li>GET /showtimes/search?date=YYYY-MM-DD or ?from=&to= (optional movie_id) - Search showtimes by date (requires JWT)</li>
+        <li>GET /showtimes/<showtime_id>/seatmap - Compact seat map (requires JWT)</li>
+        <li>GET /showtimes/<showtime_id>/events - Live seat changes as Server-Sent Events (requires JWT)</li>
         <li>POST /seats - Create seats for a showtime (admin only)</li>
         <li>POST /reservations - Create a reservation (requires JWT)</li>
+        <li>POST /showtimes/<showtime_id>/waitlist - Join a sold-out showtime's waitlist (requires JWT)</li>
+        <li>POST /showtimes/<showtime_id>/queue - Join a showtime's waiting room; GET polls position or returns the admission token (requires JWT)</li>
+        <li>PUT /showtimes/<showtime_id>/admission - Set a showtime's waiting room ceiling (admin only)</li>
+        <li>POST /checkout - Book seats for several showtimes with one payment (requires JWT)</li>
+        <li>PUT /reservations/<reservation_id> - Change a reservation's seats or payment (requires JWT)</li>
+        <li>POST /holds - Hold seats during checkout (requires JWT)</li>
         <li>DELETE /reservations/<reservation_id> - Cancel a reservation (requires JWT)</li>
         <li>GET /admin/report - Admin report (admin only)</li>
+        <li>POST /admin/reservations/cancel - Cancel every reservation of a showtime, or a list of reservations (admin only)</li>
+        <li>GET /admin/seat-locks - Seat lock metrics of the serving worker (admin only)</li>
+        <li>GET /admin/reservation-expiry - Unpaid reservation expiry job metrics (admin only)</li>
     </ul>
     <p>Use an API client like Postman or Thunder Client to test these endpoints with appropriate HTTP methods and headers.</p>
     """
     
 
+# Release expired seat holds once: `flask sweep-holds`
+@app.cli.command('sweep-holds')
+def sweep_holds_command():
+    released = sweep_expired_holds()
+    print(f"Released {released} seats from expired holds")
+
+# Expire unpaid PayPal / cash reservations once: `flask expire-reservations`
+@app.cli.command('expire-reservations')
+def expire_reservations_command():
+    expired, released = expire_reservations(
+        timedelta(minutes=app.config['RESERVATION_PAYMENT_TTL_MINUTES']),
+        batch_size=app.config['RESERVATION_EXPIRY_BATCH_SIZE']
+    )
+    print(f"Expired {expired} reservations, released {released} seats")
+
+# Compare seats with reservation_seats and optionally fix drift: `flask check-seats [--repair]`
+@app.cli.command('check-seats')
+@click.option('--repair', is_flag=True, help='Fix orphaned links and mismatched is_reserved flags.')
+@click.option('--batch-size', default=10000, show_default=True, help='Seat ids checked per batch.')
+def check_seats_command(repair, batch_size):
+    totals = dict.fromkeys(FINDING_KINDS, 0)
+    for finding in check_seat_consistency(batch_size=batch_size, repair=repair):
+        totals[finding["kind"]] += 1
+        print(json.dumps(finding))
+    for kind, count in totals.items():
+        action = "repaired" if repair and FINDING_KINDS[kind] and count else "found"
+        print(f"{kind}: {count} {action}")
+
+# Recompute showtime seat counters from the seats table: `flask recount-seats [--verify]`
+@app.cli.command('recount-seats')
+@click.option('--verify', is_flag=True, help='Only report showtimes whose counters have drifted.')
+def recount_seats_command(verify):
+    drift = recount_seat_counters(apply=not verify)
+    for showtime_id, stored, actual in drift:
+        print(f"Showtime {showtime_id}: stored available/reserved {stored}, actual {actual}")
+    if verify:
+        print(f"{len(drift)} showtimes out of sync")
+    else:
+        db.session.commit()
+        print(f"Fixed counters on {len(drift)} showtimes")
+
+
 if __name__ == '__main__':
+    with app.app_context():
+        seat_store.rebuild()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,128 @@
+from sqlalchemy import update, delete
+from models import db, Reservation, Payment, SeatHold
+from inventory import (claim_seats, claim_seat_numbers, release_seats, create_holds, link_reservation_seats,
+                       seat_numbers_for)
+from allocation import claim_best_available
+
+PAYMENT_METHODS = ('credit_card', 'paypal', 'cash')
+
+# (reservation status, payment status) when a booking is created, per payment method
+INITIAL_STATUSES = {
+    'credit_card': ('pending', 'pending'),  # Settled right after the Stripe charge
+    'paypal': ('awaiting_payment', 'processing'),
+    'cash': ('awaiting_verification', 'pending'),
+}
+
+
+def validate_seats(seat_ids, seat_numbers):
+    """Return an error message unless seat_ids is a list of ints and seat_numbers a list of strings, else None."""
+    if seat_ids and (not isinstance(seat_ids, list) or not all(
+        isinstance(seat_id, int) and not isinstance(seat_id, bool) for seat_id in seat_ids
+    )):
+        return "seat_ids must be a list of seat ids"
+    if seat_numbers and (not isinstance(seat_numbers, list) or not all(
+        isinstance(seat_number, str) for seat_number in seat_numbers
+    )):
+        return "seat_numbers must be a list of seat numbers like 'A1'"
+    return None
+
+
+def validate_item(item):
+    """Return an error message if a booking item is malformed, else None."""
+    if not isinstance(item, dict) or not item.get('showtime_id'):
+        return "Each item needs a showtime_id"
+    if item.get('seat_ids') or item.get('seat_numbers'):
+        return validate_seats(item.get('seat_ids'), item.get('seat_numbers'))
+    seat_count = item.get('seat_count')
+    if not isinstance(seat_count, int) or seat_count < 1:
+        return "Each item needs seat_ids, seat_numbers or a positive seat_count"
+    return None
+
+
+def _group_by_showtime(items):
+    grouped = {}
+    for item in items:
+        group = grouped.setdefault(item['showtime_id'], {'seat_ids': [], 'seat_numbers': [], 'seat_count': 0})
+        group['seat_ids'].extend(item.get('seat_ids') or [])
+        group['seat_numbers'].extend(item.get('seat_numbers') or [])
+        if not (item.get('seat_ids') or item.get('seat_numbers')):
+            group['seat_count'] += item['seat_count']
+    return grouped
+
+
+def create_bookings(user_id, items, payment_method, seat_price, hold_expires_at):
+    """
+    Claim seats and create one Reservation and Payment per showtime.
+
+    Items for the same showtime are merged into one claim per showtime, and
+    showtimes are claimed in id order so concurrent carts lock rows in the
+    same order. Seats stay on hold until the booking is settled. Nothing is
+    committed here; on SeatUnavailableError the caller must roll back.
+
+    :return: List of dicts with reservation_id, showtime_id, seat_ids, seat_numbers and amount
+    """
+    status, payment_status = INITIAL_STATUSES[payment_method]
+    grouped = _group_by_showtime(items)
+
+    bookings = []
+    for showtime_id in sorted(grouped):
+        group = grouped[showtime_id]
+        seat_ids = set()
+        if group['seat_ids']:
+            seat_ids |= claim_seats(showtime_id, group['seat_ids'], user_id=user_id)
+        if group['seat_numbers']:
+            seat_ids |= claim_seat_numbers(showtime_id, group['seat_numbers'], user_id=user_id)
+        if group['seat_count']:
+            seat_ids |= claim_best_available(showtime_id, group['seat_count'])
+        amount = len(seat_ids) * seat_price
+
+        reservation = Reservation(user_id=user_id, showtime_id=showtime_id, status=status)
+        db.session.add(reservation)
+        db.session.flush()
+        db.session.add(Payment(
+            user_id=user_id,
+            reservation_id=reservation.id,
+            amount=amount,
+            payment_method=payment_method,
+            status=payment_status
+        ))
+        link_reservation_seats(reservation.id, seat_ids)
+        create_holds(showtime_id, seat_ids, user_id, hold_expires_at, reservation.id)
+
+        bookings.append({
+            "reservation_id": reservation.id,
+            "showtime_id": showtime_id,
+            "seat_ids": seat_ids,
+            "seat_numbers": sorted(seat_numbers_for(seat_ids)),
+            "amount": amount
+        })
+    return bookings
+
+
+def settle_bookings(bookings, paid):
+    """
+    Confirm bookings after a successful charge, or release their seats after a failed one.
+
+    Drops the holds and updates every reservation and payment with one
+    statement per table. Nothing is committed here.
+
+    :return: The new reservation status
+    """
+    reservation_ids = [booking["reservation_id"] for booking in bookings]
+    status, payment_status = ('confirmed', 'completed') if paid else ('payment_failed', 'failed')
+
+    db.session.execute(delete(SeatHold).where(SeatHold.reservation_id.in_(reservation_ids)))
+    if not paid:
+        for booking in bookings:
+            release_seats(booking["showtime_id"], booking["seat_ids"])
+
+    db.session.execute(
+        update(Reservation).where(Reservation.id.in_(reservation_ids))
+        .values(status=status, version_id=Reservation.version_id + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        update(Payment).where(Payment.reservation_id.in_(reservation_ids)).values(status=payment_status)
+        .execution_options(synchronize_session=False)
+    )
+    return status
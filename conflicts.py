@@ -0,0 +1,78 @@
+from datetime import timedelta
+from sqlalchemy import select, func
+from models import db, Showtime
+
+
+def sweep_overlaps(existing, proposed):
+    """
+    Find overlaps involving proposed intervals with one sort and one sweep.
+
+    Both arguments are lists of (start, end, key). Intervals are half-open,
+    so a showtime may start the minute the previous one ends. Overlaps
+    among existing intervals are ignored. Every proposed interval that
+    overlaps anything is reported at least once, paired with one interval
+    it overlaps. O(n log n) in the total count.
+
+    :return: List of (key, other_key) pairs
+    """
+    events = sorted(
+        [(start, end, key, False) for start, end, key in existing] +
+        [(start, end, key, True) for start, end, key in proposed],
+        key=lambda event: event[0]
+    )
+    conflicts = []
+    latest = None  # (end, key) with the greatest end so far
+    latest_proposed = None  # Same, among proposed intervals only
+    for start, end, key, is_proposed in events:
+        if is_proposed:
+            if latest and start < latest[0]:
+                conflicts.append((key, latest[1]))
+            if not latest_proposed or end > latest_proposed[0]:
+                latest_proposed = (end, key)
+        elif latest_proposed and start < latest_proposed[0]:
+            conflicts.append((latest_proposed[1], key))
+        if not latest or end > latest[0]:
+            latest = (end, key)
+    return conflicts
+
+
+def hall_conflicts(auditorium_id, start_times, duration):
+    """
+    Check new showtimes of the given duration against each other and the hall's schedule.
+
+    Existing showtimes are read with one range query on
+    (auditorium_id, start_time), reaching back by the hall's longest
+    duration so a long film still running at the first new start is seen.
+
+    :return: List of {"start_time", "conflicts_with"} dicts; conflicts_with is a showtime id
+             or the start time of another new showtime
+    """
+    if not start_times:
+        return []
+    length = timedelta(minutes=int(duration))
+    proposed = [(start_time, start_time + length, ('new', start_time)) for start_time in start_times]
+
+    longest = db.session.query(func.max(Showtime.duration)).filter(Showtime.auditorium_id == auditorium_id).scalar()
+    existing = []
+    if longest:
+        rows = db.session.execute(
+            select(Showtime.id, Showtime.start_time, Showtime.duration)
+            .where(
+                Showtime.auditorium_id == auditorium_id,
+                Showtime.start_time > min(start_times) - timedelta(minutes=longest),
+                Showtime.start_time < max(start_times) + length
+            )
+        )
+        existing = [
+            (start_time, start_time + timedelta(minutes=minutes), ('showtime', showtime_id))
+            for showtime_id, start_time, minutes in rows
+        ]
+
+    def describe(key):
+        return key[1].isoformat() if key[0] == 'new' else key[1]
+
+    conflicts = []
+    for key, other in sweep_overlaps(existing, proposed):
+        new, clash = (key, other) if key[0] == 'new' else (other, key)
+        conflicts.append({"start_time": new[1].isoformat(), "conflicts_with": describe(clash)})
+    return sorted(conflicts, key=lambda conflict: conflict["start_time"])
@@ -0,0 +1,148 @@
+from sqlalchemy import select, update, delete, func, or_, and_
+from models import db, Seat, SeatHold, Reservation, reservation_seats
+from inventory import INACTIVE_RESERVATION_STATUSES, recount_seat_counters, bump_seat_versions
+from seat_store import seat_store
+
+# Kinds of drift between Seat.is_reserved and reservation_seats, and whether repair fixes them
+FINDING_KINDS = {
+    'orphan_link': True,        # reservation_seats row whose reservation or seat is gone: deleted
+    'reserved_unowned': True,   # Reserved seat with no active reservation and no hold: freed
+    'owned_unreserved': True,   # Free seat linked to exactly one active reservation: reserved
+    'double_booked': False,     # Seat linked to several active reservations: reported only
+    'wrong_showtime': False,    # Active reservation linked to a seat of another showtime: reported only
+}
+
+
+def _active_links(lo, hi):
+    """reservation_seats rows of active reservations for seat ids in [lo, hi)."""
+    return (
+        select(reservation_seats.c.seat_id, reservation_seats.c.reservation_id, Reservation.showtime_id)
+        .join(Reservation, Reservation.id == reservation_seats.c.reservation_id)
+        .where(
+            reservation_seats.c.seat_id >= lo,
+            reservation_seats.c.seat_id < hi,
+            Reservation.status.notin_(INACTIVE_RESERVATION_STATUSES)
+        )
+    )
+
+
+def _owned(seat_id_column, lo, hi):
+    links = _active_links(lo, hi).subquery()
+    return select(links.c.seat_id).where(links.c.seat_id == seat_id_column).exists()
+
+
+def _held(seat_id_column):
+    return select(SeatHold.id).where(SeatHold.seat_id == seat_id_column).exists()
+
+
+def _check_range(lo, hi):
+    """Yield the findings for seat ids in [lo, hi); every query returns only anomalies."""
+    orphans = db.session.execute(
+        select(reservation_seats.c.seat_id, reservation_seats.c.reservation_id)
+        .outerjoin(Reservation, Reservation.id == reservation_seats.c.reservation_id)
+        .outerjoin(Seat, Seat.id == reservation_seats.c.seat_id)
+        .where(
+            reservation_seats.c.seat_id >= lo,
+            reservation_seats.c.seat_id < hi,
+            or_(Reservation.id.is_(None), Seat.id.is_(None))
+        )
+    )
+    for seat_id, reservation_id in orphans:
+        yield {"kind": 'orphan_link', "seat_id": seat_id, "reservation_id": reservation_id}
+
+    in_range = and_(Seat.id >= lo, Seat.id < hi)
+    for seat_id, showtime_id in db.session.execute(
+        select(Seat.id, Seat.showtime_id)
+        .where(in_range, Seat.is_reserved == True, ~_owned(Seat.id, lo, hi), ~_held(Seat.id))
+    ):
+        yield {"kind": 'reserved_unowned', "seat_id": seat_id, "showtime_id": showtime_id}
+
+    for seat_id, showtime_id in db.session.execute(
+        select(Seat.id, Seat.showtime_id).where(in_range, Seat.is_reserved == False, _owned(Seat.id, lo, hi))
+    ):
+        yield {"kind": 'owned_unreserved', "seat_id": seat_id, "showtime_id": showtime_id}
+
+    links = _active_links(lo, hi).subquery()
+    shared = select(links.c.seat_id).group_by(links.c.seat_id).having(func.count() > 1)
+    double_booked = {}
+    for seat_id, reservation_id in db.session.execute(
+        select(links.c.seat_id, links.c.reservation_id).where(links.c.seat_id.in_(shared)).order_by(links.c.seat_id)
+    ):
+        double_booked.setdefault(seat_id, []).append(reservation_id)
+    for seat_id, reservation_ids in double_booked.items():
+        yield {"kind": 'double_booked', "seat_id": seat_id, "reservation_ids": reservation_ids}
+
+    for seat_id, reservation_id, seat_showtime_id, reservation_showtime_id in db.session.execute(
+        select(links.c.seat_id, links.c.reservation_id, Seat.showtime_id, links.c.showtime_id)
+        .join(Seat, Seat.id == links.c.seat_id)
+        .where(Seat.showtime_id != links.c.showtime_id)
+    ):
+        yield {
+            "kind": 'wrong_showtime',
+            "seat_id": seat_id,
+            "reservation_id": reservation_id,
+            "showtime_id": seat_showtime_id,
+            "reservation_showtime_id": reservation_showtime_id
+        }
+
+
+def _repair_range(lo, hi):
+    """
+    Fix the repairable findings for seat ids in [lo, hi) with one statement per kind.
+
+    Returns the ids of showtimes whose seats changed. Caller commits.
+    """
+    missing = or_(
+        ~select(Reservation.id).where(Reservation.id == reservation_seats.c.reservation_id).exists(),
+        ~select(Seat.id).where(Seat.id == reservation_seats.c.seat_id).exists()
+    )
+    db.session.execute(
+        delete(reservation_seats)
+        .where(reservation_seats.c.seat_id >= lo, reservation_seats.c.seat_id < hi, missing)
+    )
+
+    in_range = and_(Seat.id >= lo, Seat.id < hi)
+    to_free = and_(in_range, Seat.is_reserved == True, ~_owned(Seat.id, lo, hi), ~_held(Seat.id))
+    links = _active_links(lo, hi).subquery()
+    single_owner = select(links.c.seat_id).group_by(links.c.seat_id).having(func.count() == 1)
+    to_reserve = and_(in_range, Seat.is_reserved == False, Seat.id.in_(single_owner))
+
+    changed = set()
+    for condition, reserved in ((to_free, False), (to_reserve, True)):
+        showtime_ids = set(db.session.scalars(select(Seat.showtime_id).where(condition).distinct()))
+        if not showtime_ids:
+            continue
+        changed |= showtime_ids
+        db.session.execute(
+            update(Seat).where(condition)
+            .values(is_reserved=reserved, version_id=Seat.version_id + 1)
+            .execution_options(synchronize_session=False)
+        )
+    return changed
+
+
+def check_seat_consistency(batch_size=10000, repair=False):
+    """
+    Compare Seat.is_reserved with reservation_seats, one range of seat ids at a time.
+
+    Yields findings as dicts with a 'kind' from FINDING_KINDS. Memory stays
+    bounded by the batch size, not the table. With repair, each range is
+    fixed, the touched showtimes' counters are recounted, and the batch is
+    committed after its findings are yielded. Double bookings and
+    wrong-showtime links need a human and are only reported.
+    """
+    top = max(
+        db.session.query(func.max(Seat.id)).scalar() or 0,
+        db.session.query(func.max(reservation_seats.c.seat_id)).scalar() or 0
+    )
+    for lo in range(1, top + 1, batch_size):
+        hi = lo + batch_size
+        yield from _check_range(lo, hi)
+        if repair:
+            changed = _repair_range(lo, hi)
+            if changed:
+                recount_seat_counters(showtime_ids=changed)
+                bump_seat_versions(changed)
+            db.session.commit()
+            for showtime_id in changed:
+                seat_store.invalidate(showtime_id)
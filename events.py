@@ -0,0 +1,104 @@
+import queue
+import threading
+from seat_store import seat_store
+
+
+class SeatEventBus:
+    """In-process pub/sub of seat changes, one bounded queue per subscriber.
+
+    A subscriber that falls behind does not block publishers: when its queue
+    is full it is emptied and handed a single 'resync' event, telling the
+    client to refetch the seat map.
+    """
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._subscribers = {}  # showtime_id -> set of queues
+
+    def subscribe(self, showtime_id):
+        subscriber = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.setdefault(showtime_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, showtime_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(showtime_id)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[showtime_id]
+
+    def subscriber_count(self, showtime_id):
+        with self._lock:
+            return len(self._subscribers.get(showtime_id, ()))
+
+    def publish(self, showtime_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(showtime_id, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                self._resync(subscriber)
+
+    def _resync(self, subscriber):
+        try:
+            while True:
+                subscriber.get_nowait()
+        except queue.Empty:
+            pass
+        subscriber.put_nowait({"type": "resync"})
+
+
+seat_events = SeatEventBus()
+
+# Called with a showtime_id whenever seats of that showtime are released
+release_callbacks = []
+
+# Called with a showtime_id after any seat change of that showtime
+change_callbacks = []
+
+
+def sync_seats(showtime_id):
+    """
+    Pick up seat changes other processes committed for a showtime and push them to live subscribers.
+
+    Each worker has its own event bus, so this is how SSE clients learn about
+    bookings made on another worker.
+    """
+    _, claimed, released = seat_store.refresh(showtime_id)
+    if (claimed or released) and seat_events.subscriber_count(showtime_id):
+        seat_events.publish(showtime_id, {
+            "type": "seats",
+            "claimed": claimed,
+            "released": released,
+            "available": seat_store.available_count(showtime_id)
+        })
+
+
+def seats_changed(showtime_id, claimed=(), released=()):
+    """
+    Apply a committed seat change to the seat store and push it to live subscribers.
+
+    Call after the transaction commits, with seat numbers.
+    """
+    claimed, released = list(claimed), list(released)
+    if claimed:
+        seat_store.mark_reserved(showtime_id, claimed)
+    if released:
+        seat_store.mark_available(showtime_id, released)
+    if (claimed or released) and seat_events.subscriber_count(showtime_id):
+        seat_events.publish(showtime_id, {
+            "type": "seats",
+            "claimed": claimed,
+            "released": released,
+            "available": seat_store.available_count(showtime_id)
+        })
+    if claimed or released:
+        for callback in change_callbacks:
+            callback(showtime_id)
+    if released:
+        for callback in release_callbacks:
+            callback(showtime_id)
@@ -0,0 +1,100 @@
+import hashlib
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app, request, jsonify, make_response
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from models import db, IdempotencyKey
+
+
+def _request_hash():
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.path.encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def idempotent(view):
+    """
+    Make a JWT-protected endpoint safe to retry with an Idempotency-Key header.
+
+    The first request with a key runs normally and its response is stored
+    against (key, user). Replays get the stored response without running the
+    view again. Reusing a key for a different request is rejected, and so is
+    a replay that arrives while the first request is still running. 5xx
+    responses are not stored, so those requests can be retried.
+    Requests without the header are passed straight through.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > 255:
+            return jsonify({"message": "Idempotency-Key must be <= 255 characters"}), 400
+
+        user_id = get_jwt_identity()
+        request_hash = _request_hash()
+
+        record = IdempotencyKey.query.filter_by(key=key, user_id=user_id).first()
+        if record:
+            stale = datetime.utcnow() - timedelta(seconds=current_app.config['IDEMPOTENCY_LOCK_SECONDS'])
+            if record.request_hash != request_hash:
+                return jsonify({"message": "Idempotency-Key was already used for a different request"}), 422
+            if record.status_code is not None:
+                return _replay(record)
+            if record.created_at > stale:
+                return jsonify({"message": "A request with this Idempotency-Key is still in progress"}), 409
+            # The first attempt died without recording a response; let this one run instead
+            db.session.delete(record)
+            db.session.commit()
+
+        # Claim the key before running the view; the unique constraint settles races
+        record = IdempotencyKey(key=key, user_id=user_id, request_hash=request_hash)
+        db.session.add(record)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({"message": "A request with this Idempotency-Key is still in progress"}), 409
+        record_id = record.id
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            db.session.rollback()
+            _forget(record_id)
+            raise
+
+        if response.status_code >= 500 or response.is_streamed:
+            _forget(record_id)
+            return response
+
+        record = db.session.get(IdempotencyKey, record_id)
+        record.status_code = response.status_code
+        record.response_body = response.get_data(as_text=True)
+        db.session.commit()
+        return response
+
+    return wrapper
+
+
+def _replay(record):
+    response = make_response(record.response_body, record.status_code)
+    response.mimetype = 'application/json'
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _forget(record_id):
+    db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.id == record_id))
+    db.session.commit()
+
+
+def purge_idempotency_keys(older_than):
+    """Delete stored responses created before older_than. Returns the number removed."""
+    result = db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < older_than))
+    db.session.commit()
+    return result.rowcount
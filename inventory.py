@@ -0,0 +1,492 @@
+from sqlalchemy import update, delete, insert, select, func, case, bindparam
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Seat, SeatHold, Reservation, Payment, Showtime, Auditorium, AuditoriumSeat, reservation_seats
+
+# Reservation states whose seats are only held, and expire with their holds
+HELD_RESERVATION_STATUSES = ('pending', 'awaiting_payment', 'awaiting_verification')
+
+# Reservation states waiting on PayPal or a cash check; they expire after RESERVATION_PAYMENT_TTL_MINUTES
+AWAITING_PAYMENT_STATUSES = ('awaiting_payment', 'awaiting_verification')
+
+# Reservation states that no longer own their seats; their reservation_seats rows are only history
+INACTIVE_RESERVATION_STATUSES = ('expired', 'payment_failed')
+
+
+class SeatUnavailableError(Exception):
+    """Raised when a seat claim cannot be applied to every requested seat."""
+    pass
+
+
+def claim_seats(showtime_id, seat_ids, user_id=None):
+    """
+    Atomically mark seats as reserved for a showtime.
+
+    Issues a single conditional UPDATE and checks its rowcount, so the claim
+    either covers every seat or the caller must roll back. Nothing is
+    committed here; the claim is part of the caller's transaction.
+
+    :param showtime_id: Showtime the seats must belong to
+    :param seat_ids: Iterable of seat ids to claim
+    :param user_id: If given, seats this user already holds are taken over
+    :return: The set of claimed seat ids
+    :raises SeatUnavailableError: if any seat is taken or belongs to another showtime
+    """
+    seat_ids = set(seat_ids)
+    held = _take_over_holds(user_id, showtime_id, seat_ids) if user_id is not None else set()
+    to_claim = seat_ids - held
+    if not to_claim:
+        return seat_ids
+
+    result = db.session.execute(
+        update(Seat)
+        .where(Seat.id.in_(to_claim), Seat.showtime_id == showtime_id, Seat.is_reserved == False)
+        .values(is_reserved=True, version_id=Seat.version_id + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == len(to_claim):
+        adjust_seat_counters(showtime_id, reserved=len(to_claim))
+        return seat_ids
+
+    # Only reached on failure: work out which message to give the client.
+    owned = db.session.query(func.count(Seat.id)) \
+        .filter(Seat.id.in_(to_claim), Seat.showtime_id == showtime_id).scalar()
+    if owned != len(to_claim):
+        raise SeatUnavailableError("One or more seats do not belong to this showtime")
+    raise SeatUnavailableError("One or more seats are already reserved")
+
+
+def release_seats(showtime_id, seat_ids):
+    """
+    Mark reserved seats of a showtime as available again in one UPDATE.
+
+    Seats that are already free are left alone, so the showtime counters only
+    move by the number of seats actually released. Nothing is committed here.
+
+    :return: Number of seats released
+    """
+    seat_ids = set(seat_ids)
+    if not seat_ids:
+        return 0
+    result = db.session.execute(
+        update(Seat)
+        .where(Seat.id.in_(seat_ids), Seat.showtime_id == showtime_id, Seat.is_reserved == True)
+        .values(is_reserved=False, version_id=Seat.version_id + 1)
+        .execution_options(synchronize_session=False)
+    )
+    adjust_seat_counters(showtime_id, reserved=-result.rowcount)
+    return result.rowcount
+
+
+def adjust_seat_counters(showtime_id, reserved=0, added=0):
+    """
+    Move a showtime's available_seats/reserved_seats counters in the current transaction.
+
+    :param reserved: Seats that went from available to reserved (negative for releases)
+    :param added: Newly created, available seats
+    """
+    if not reserved and not added:
+        return
+    db.session.execute(
+        update(Showtime)
+        .where(Showtime.id == showtime_id)
+        .values(
+            available_seats=Showtime.available_seats + added - reserved,
+            reserved_seats=Showtime.reserved_seats + reserved,
+            seat_version=Showtime.seat_version + 1
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def adjust_counters_bulk(reserved_by_showtime):
+    """
+    Like adjust_seat_counters for many showtimes at once, in one executemany UPDATE.
+
+    :param reserved_by_showtime: dict mapping showtime_id to seats reserved (negative for releases)
+    """
+    deltas = [
+        {"showtime_id": showtime_id, "reserved": reserved}
+        for showtime_id, reserved in reserved_by_showtime.items() if reserved
+    ]
+    if not deltas:
+        return
+    showtimes = Showtime.__table__
+    db.session.execute(
+        showtimes.update()
+        .where(showtimes.c.id == bindparam('showtime_id'))
+        .values(
+            available_seats=showtimes.c.available_seats - bindparam('reserved'),
+            reserved_seats=showtimes.c.reserved_seats + bindparam('reserved'),
+            seat_version=showtimes.c.seat_version + 1
+        ),
+        deltas
+    )
+
+
+def bump_seat_versions(showtime_ids):
+    """Mark showtimes' seats as changed (see Showtime.seat_version) without touching the counters."""
+    if showtime_ids:
+        db.session.execute(
+            update(Showtime).where(Showtime.id.in_(showtime_ids))
+            .values(seat_version=Showtime.seat_version + 1)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def insert_seats(showtime_ids, positions):
+    """
+    Create the same seats for every showtime in one executemany INSERT.
+
+    :param showtime_ids: Showtimes to add the seats to
+    :param positions: (seat_number, row, column) tuples, e.g. from layouts.expand_layout
+    :return: Number of seats inserted
+    """
+    rows = [
+        {
+            "seat_number": seat_number,
+            "row": row,
+            "column": column,
+            "is_reserved": False,
+            "showtime_id": showtime_id
+        }
+        for showtime_id in showtime_ids
+        for seat_number, row, column in positions
+    ]
+    if not rows:
+        return 0
+    db.session.execute(insert(Seat), rows)
+    db.session.execute(
+        update(Showtime)
+        .where(Showtime.id.in_(showtime_ids))
+        .values(available_seats=Showtime.available_seats + len(positions), seat_version=Showtime.seat_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return len(rows)
+
+
+def recount_seat_counters(apply=True, showtime_ids=None):
+    """
+    Recompute showtime seat counters from the seats table with one GROUP BY.
+
+    :param apply: Write the recomputed values back; when False only report drift
+    :param showtime_ids: Limit the recount to these showtimes (default: all)
+    :return: List of (showtime_id, (available, reserved) stored, (available, reserved) actual) that differed
+    """
+    reserved = func.sum(case((Seat.is_reserved == True, 1), else_=0))
+    seat_counts = select(Seat.showtime_id, func.count(Seat.id), reserved).group_by(Seat.showtime_id)
+    showtimes = select(Showtime.id, Showtime.available_seats, Showtime.reserved_seats, Auditorium.capacity) \
+        .outerjoin(Auditorium, Showtime.auditorium_id == Auditorium.id)
+    if showtime_ids is not None:
+        seat_counts = seat_counts.where(Seat.showtime_id.in_(showtime_ids))
+        showtimes = showtimes.where(Showtime.id.in_(showtime_ids))
+    counts = {
+        showtime_id: (total, taken or 0)
+        for showtime_id, total, taken in db.session.execute(seat_counts)
+    }
+
+    drift = []
+    for showtime_id, available, taken, template_capacity in db.session.execute(showtimes):
+        total, actual_taken = counts.get(showtime_id, (0, 0))
+        # Template-backed showtimes only store claimed seats; capacity comes from the auditorium
+        capacity = template_capacity if template_capacity is not None else total
+        actual = (capacity - actual_taken, actual_taken)
+        if (available, taken) != actual:
+            drift.append((showtime_id, (available, taken), actual))
+
+    if apply and drift:
+        # Core executemany: the counters sit outside Showtime's version_id, which ORM bulk updates would demand
+        showtimes = Showtime.__table__
+        db.session.execute(
+            showtimes.update().where(showtimes.c.id == bindparam('showtime_id'))
+            .values(seat_version=showtimes.c.seat_version + 1),
+            [
+                {"showtime_id": showtime_id, "available_seats": actual[0], "reserved_seats": actual[1]}
+                for showtime_id, _, actual in drift
+            ]
+        )
+    return drift
+
+
+def claim_seat_numbers(showtime_id, seat_numbers, user_id=None):
+    """
+    Claim seats by seat number (e.g. 'C7') rather than by seat id.
+
+    For showtimes backed by an auditorium template the seat rows are
+    materialized first, so the seats table only ever holds the seats that
+    have been claimed. Raises SeatUnavailableError like claim_seats.
+
+    :return: The set of claimed seat ids
+    """
+    seat_numbers = set(seat_numbers)
+    auditorium_id = db.session.scalar(select(Showtime.auditorium_id).where(Showtime.id == showtime_id))
+    if auditorium_id is not None:
+        materialize_seats(showtime_id, auditorium_id, seat_numbers)
+
+    seat_ids = set(db.session.scalars(
+        select(Seat.id).where(Seat.showtime_id == showtime_id, Seat.seat_number.in_(seat_numbers))
+    ))
+    if len(seat_ids) != len(seat_numbers):
+        raise SeatUnavailableError("One or more seats do not exist for this showtime")
+    return claim_seats(showtime_id, seat_ids, user_id=user_id)
+
+
+def materialize_seats(showtime_id, auditorium_id, seat_numbers):
+    """Insert free seat rows for template seats of a showtime, skipping rows that already exist."""
+    template = db.session.execute(
+        select(AuditoriumSeat.seat_number, AuditoriumSeat.row, AuditoriumSeat.column).where(
+            AuditoriumSeat.auditorium_id == auditorium_id,
+            AuditoriumSeat.seat_number.in_(seat_numbers)
+        )
+    ).all()
+    if not template:
+        return
+    db.session.execute(_insert_ignore(Seat), [
+        {
+            "seat_number": seat_number,
+            "row": row,
+            "column": column,
+            "is_reserved": False,
+            "showtime_id": showtime_id
+        }
+        for seat_number, row, column in template
+    ])
+
+
+def begin_savepoint():
+    """
+    Start a SAVEPOINT so a failed step can be undone without losing the rest of the transaction.
+
+    pysqlite only opens a transaction before DML, and a SAVEPOINT issued
+    outside one is committed by its RELEASE, so on SQLite the enclosing
+    transaction is begun explicitly first. It is begun IMMEDIATE: the
+    caller is about to write, and upgrading a deferred transaction's read
+    lock can deadlock with other writers instead of waiting for them.
+    """
+    connection = db.session.connection()
+    if connection.dialect.name == 'sqlite' and not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+    return db.session.begin_nested()
+
+
+def _insert_ignore(model):
+    """INSERT that skips rows violating a unique constraint, on SQLite and PostgreSQL."""
+    dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+    return dialect.insert(model).on_conflict_do_nothing()
+
+
+def link_reservation_seats(reservation_id, seat_ids):
+    """Insert the reservation_seats rows for a reservation with one executemany INSERT."""
+    db.session.execute(insert(reservation_seats), [
+        {"reservation_id": reservation_id, "seat_id": seat_id} for seat_id in seat_ids
+    ])
+
+
+def seat_numbers_for(seat_ids):
+    """Look up the seat numbers of seat_ids with one query."""
+    return list(db.session.scalars(select(Seat.seat_number).where(Seat.id.in_(seat_ids))))
+
+
+def create_auditorium(name, positions):
+    """
+    Create an auditorium and its seat template with one executemany INSERT.
+
+    :param positions: (seat_number, row, column) tuples, e.g. from layouts.expand_layout
+    :return: The new Auditorium
+    """
+    auditorium = Auditorium(name=name, capacity=len(positions))
+    db.session.add(auditorium)
+    db.session.flush()
+    db.session.execute(insert(AuditoriumSeat), [
+        {"auditorium_id": auditorium.id, "seat_number": seat_number, "row": row, "column": column}
+        for seat_number, row, column in positions
+    ])
+    return auditorium
+
+
+def _take_over_holds(user_id, showtime_id, seat_ids):
+    """
+    Drop the user's own standalone holds on seat_ids; those seats stay reserved for the caller.
+
+    Holds attached to a reservation (PayPal / cash awaiting payment) are left
+    alone: those seats belong to that reservation and count as reserved.
+    """
+    held = set(db.session.scalars(
+        select(SeatHold.seat_id).where(
+            SeatHold.user_id == user_id,
+            SeatHold.showtime_id == showtime_id,
+            SeatHold.seat_id.in_(seat_ids),
+            SeatHold.reservation_id.is_(None)
+        )
+    ))
+    if held:
+        db.session.execute(delete(SeatHold).where(SeatHold.seat_id.in_(held)))
+    return held
+
+
+def create_holds(showtime_id, seat_ids, user_id, expires_at, reservation_id=None):
+    """Record holds for already-claimed seats with a single executemany INSERT."""
+    db.session.execute(insert(SeatHold), [
+        {
+            "seat_id": seat_id,
+            "showtime_id": showtime_id,
+            "user_id": user_id,
+            "reservation_id": reservation_id,
+            "expires_at": expires_at
+        }
+        for seat_id in seat_ids
+    ])
+
+
+def _free_seats(seat_ids):
+    """
+    Mark still-reserved seats free in one UPDATE ... RETURNING and move the counters by what it changed.
+
+    Counting from the returned rows rather than an earlier SELECT keeps
+    concurrent releases of the same seats from being counted twice.
+
+    :param seat_ids: SELECT of seat ids
+    :return: dict mapping showtime_id to the list of released seat numbers
+    """
+    released = {}
+    for showtime_id, seat_number in db.session.execute(
+        update(Seat)
+        .where(Seat.id.in_(seat_ids), Seat.is_reserved == True)
+        .values(is_reserved=False, version_id=Seat.version_id + 1)
+        .returning(Seat.showtime_id, Seat.seat_number)
+        .execution_options(synchronize_session=False)
+    ):
+        released.setdefault(showtime_id, []).append(seat_number)
+    adjust_counters_bulk({showtime_id: -len(seat_numbers) for showtime_id, seat_numbers in released.items()})
+    return released
+
+
+def release_reservation_seats(reservation_ids):
+    """
+    Free the seats owned by reservations with one UPDATE joined through reservation_seats.
+
+    Only reservations that still own their seats count; expired or failed
+    ones may have had them resold. Showtime counters move in one
+    executemany. Nothing is committed here.
+
+    :param reservation_ids: List of ids, or a SELECT of reservation ids
+    :return: dict mapping showtime_id to the list of released seat numbers
+    """
+    return _free_seats(
+        select(reservation_seats.c.seat_id)
+        .join(Reservation, Reservation.id == reservation_seats.c.reservation_id)
+        .where(
+            reservation_seats.c.reservation_id.in_(reservation_ids),
+            Reservation.status.notin_(INACTIVE_RESERVATION_STATUSES)
+        )
+    )
+
+
+def delete_reservation_holds(reservation_ids):
+    """Forget the holds attached to reservations without touching their seats."""
+    db.session.execute(delete(SeatHold).where(SeatHold.reservation_id.in_(reservation_ids)))
+
+
+def cancel_reservations(reservation_ids):
+    """
+    Delete reservations and free the seats they own, with one statement per table.
+
+    Nothing is committed here.
+
+    :param reservation_ids: List of ids, or a SELECT of reservation ids (e.g. every reservation of a showtime)
+    :return: (number of reservations deleted, dict mapping showtime_id to the released seat numbers)
+    """
+    released = release_reservation_seats(reservation_ids)
+    delete_reservation_holds(reservation_ids)
+    db.session.execute(delete(reservation_seats).where(reservation_seats.c.reservation_id.in_(reservation_ids)))
+    db.session.execute(delete(Payment).where(Payment.reservation_id.in_(reservation_ids)))
+    result = db.session.execute(
+        delete(Reservation).where(Reservation.id.in_(reservation_ids))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount, released
+
+
+def release_expired_holds(now):
+    """
+    Release every hold that expired at or before now.
+
+    The holds are removed first with one DELETE ... RETURNING on the
+    expires_at index, and only the seats of the rows this call actually
+    deleted are freed, so overlapping sweeps (one per worker) never release
+    or count the same seat twice. Reservations left without any live hold are
+    marked 'expired'. Nothing is committed here.
+
+    :return: dict mapping showtime_id to the list of released seat numbers
+    """
+    expired = db.session.execute(
+        delete(SeatHold).where(SeatHold.expires_at <= now)
+        .returning(SeatHold.seat_id, SeatHold.reservation_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if not expired:
+        return {}
+
+    released = {}
+    for showtime_id, seat_number in db.session.execute(
+        update(Seat)
+        .where(Seat.id.in_([seat_id for seat_id, _ in expired]), Seat.is_reserved == True)
+        .values(is_reserved=False, version_id=Seat.version_id + 1)
+        .returning(Seat.showtime_id, Seat.seat_number)
+        .execution_options(synchronize_session=False)
+    ):
+        released.setdefault(showtime_id, []).append(seat_number)
+    adjust_counters_bulk({showtime_id: -len(seat_numbers) for showtime_id, seat_numbers in released.items()})
+
+    reservation_ids = {reservation_id for _, reservation_id in expired if reservation_id}
+    if reservation_ids:
+        live_holds = select(SeatHold.id).where(SeatHold.reservation_id == Reservation.id)
+        db.session.execute(
+            update(Reservation)
+            .where(
+                Reservation.id.in_(reservation_ids),
+                Reservation.status.in_(HELD_RESERVATION_STATUSES),
+                ~live_holds.exists()
+            )
+            .values(status='expired', version_id=Reservation.version_id + 1)
+            .execution_options(synchronize_session=False)
+        )
+
+    return released
+
+
+def expire_unpaid_reservations(cutoff, batch_size=500):
+    """
+    Expire awaiting_payment / awaiting_verification reservations made before cutoff.
+
+    Finds a batch through the (status, timestamp) index and claims it with a
+    conditional UPDATE to 'expired' first; only the reservations that UPDATE
+    actually changed get their seats freed and holds dropped, so overlapping
+    runs never release or count the same seats twice. Nothing is committed
+    here; call again until it returns no reservations.
+
+    :return: (number of reservations expired, dict mapping showtime_id to the released seat numbers)
+    """
+    candidates = list(db.session.scalars(
+        select(Reservation.id)
+        .where(Reservation.status.in_(AWAITING_PAYMENT_STATUSES), Reservation.timestamp < cutoff)
+        .limit(batch_size)
+    ))
+    if not candidates:
+        return 0, {}
+
+    reservation_ids = list(db.session.scalars(
+        update(Reservation)
+        .where(Reservation.id.in_(candidates), Reservation.status.in_(AWAITING_PAYMENT_STATUSES))
+        .values(status='expired', version_id=Reservation.version_id + 1)
+        .returning(Reservation.id)
+        .execution_options(synchronize_session=False)
+    ))
+    if not reservation_ids:
+        return 0, {}
+
+    # Just claimed from an awaiting status, so these reservations still own their seats
+    released = _free_seats(
+        select(reservation_seats.c.seat_id).where(reservation_seats.c.reservation_id.in_(reservation_ids))
+    )
+    delete_reservation_holds(reservation_ids)
+    return len(reservation_ids), released
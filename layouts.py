@@ -0,0 +1,70 @@
+import string
+
+# Named hall layouts for POST /seats: rows x columns, with optional gaps (seat numbers to leave out)
+LAYOUT_TEMPLATES = {
+    'small': {'rows': 5, 'columns': 10},
+    'standard': {'rows': 10, 'columns': 20},
+    'large': {'rows': 15, 'columns': 20},
+}
+
+ROW_LABELS = string.ascii_uppercase  # Seat.row holds a single character
+
+MAX_SEAT_NUMBER_LENGTH = 10  # Seat.seat_number is a String(10)
+
+MAX_LAYOUT_SEATS = 2000  # Seats one layout may expand to; bounds the INSERT of a single request
+
+
+def parse_seat_number(seat_number):
+    """Split a seat number like 'B12' into ('B', 12). Raises ValueError if malformed."""
+    if not isinstance(seat_number, str) or not 2 <= len(seat_number) <= MAX_SEAT_NUMBER_LENGTH \
+            or seat_number[0] not in ROW_LABELS:
+        raise ValueError(f"Invalid seat number: {seat_number}")
+    try:
+        column = int(seat_number[1:])
+    except ValueError:
+        raise ValueError(f"Invalid seat number: {seat_number}")
+    if not seat_number[1:].isdigit() or column < 1:  # int() also takes '+1', ' 1' and '1_0'
+        raise ValueError(f"Invalid seat number: {seat_number}")
+    return seat_number[0], column
+
+
+def expand_layout(spec):
+    """
+    Expand a layout spec into (seat_number, row, column) tuples.
+
+    A spec is either {'template': name} or {'rows': n or 'ABC', 'columns': n}
+    with an optional 'gaps' list of seat numbers (aisles, pillars) to skip.
+    A template may be combined with 'gaps'.
+
+    :raises ValueError: if the spec is malformed
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("Layout must be an object")
+
+    if 'template' in spec:
+        template = LAYOUT_TEMPLATES.get(spec['template'])
+        if template is None:
+            raise ValueError(f"Unknown layout template. Available: {', '.join(LAYOUT_TEMPLATES)}")
+        spec = {**template, 'gaps': spec.get('gaps', [])}
+
+    rows = spec.get('rows')
+    columns = spec.get('columns')
+    if isinstance(rows, int):
+        if not 1 <= rows <= len(ROW_LABELS):
+            raise ValueError(f"rows must be between 1 and {len(ROW_LABELS)}")
+        rows = ROW_LABELS[:rows]
+    if not isinstance(rows, str) or not rows or len(set(rows)) != len(rows) \
+            or any(row not in ROW_LABELS for row in rows):
+        raise ValueError("rows must be a count or a string of unique row letters")
+    if not isinstance(columns, int) or columns < 1:
+        raise ValueError("columns must be a positive integer")
+    if len(rows) * columns > MAX_LAYOUT_SEATS:
+        raise ValueError(f"A layout can have at most {MAX_LAYOUT_SEATS} seats")
+
+    gaps = set(spec.get('gaps') or [])
+    return [
+        (f"{row}{column}", row, column)
+        for row in rows
+        for column in range(1, columns + 1)
+        if f"{row}{column}" not in gaps
+    ]
@@ -0,0 +1,295 @@
+"""
+Flash-sale load test: many clients booking the same few showtimes at once.
+
+Seeds a throwaway database (seed.py's data plus a large hall, hot showtimes
+and many users), then fires POST /reservations from several threads, and
+optionally several processes, through Flask's test client. Stripe and email
+are stubbed. Reports throughput, latency percentiles, seat conflicts, lock
+errors and double bookings.
+
+    python loadtest.py --processes 4 --threads 8 --requests 4000 --showtimes 3
+
+The database defaults to a temporary SQLite file; set --database to use
+another one (it is dropped and recreated).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help='SQLAlchemy URL (default: a temporary SQLite file)')
+    parser.add_argument('--processes', type=int, default=1, help='Worker processes, each with its own threads')
+    parser.add_argument('--threads', type=int, default=8, help='Client threads per process')
+    parser.add_argument('--requests', type=int, default=1000, help='Total booking attempts across all workers')
+    parser.add_argument('--showtimes', type=int, default=3, help='Hot showtimes every client competes for')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--layout', default='large', help='Hall layout template for the hot showtimes')
+    parser.add_argument('--seats', type=int, default=2, help='Seats per booking attempt')
+    parser.add_argument('--mode', choices=('seat_numbers', 'seat_count'), default='seat_numbers',
+                        help='Pick random seats (contended) or let the server choose')
+    parser.add_argument('--payment-method', choices=('credit_card', 'paypal', 'cash'), default='credit_card')
+    parser.add_argument('--stripe-latency-ms', type=float, default=50, help='Delay of the stubbed Stripe charge')
+    parser.add_argument('--decline-rate', type=float, default=0.0, help='Share of stubbed charges that fail')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    """Point the app at the load-test database before it is imported."""
+    workdir = tempfile.mkdtemp(prefix='cinema-loadtest-')
+    os.environ['DATABASE_URL'] = args.database or f"sqlite:///{os.path.join(workdir, 'loadtest.db')}"
+    os.environ['SEAT_LOCK_DIR'] = os.path.join(workdir, 'locks')
+    os.environ.setdefault('JWT_SECRET_KEY', 'loadtest-secret-not-for-production')
+
+
+def seed_load_data(args):
+    """Reset the database, run seed.py, then add the hot showtimes and load-test users."""
+    from app import app, db
+    from models import User, Movie, Showtime, Auditorium
+    from inventory import create_auditorium
+    from layouts import expand_layout
+    from seed import seed_data
+    from sqlalchemy import insert
+
+    with app.app_context():
+        db.drop_all()
+    seed_data()
+
+    with app.app_context():
+        hall = Auditorium.query.filter_by(name="Load Test Hall").first() \
+            or create_auditorium("Load Test Hall", expand_layout({"template": args.layout}))
+        movie = Movie(
+            title="Load Test Premiere",
+            description="Opening night everyone wants a seat for.",
+            genre="Action",
+            release_date=datetime.now().date()
+        )
+        db.session.add(movie)
+        db.session.flush()
+
+        showtimes = []
+        for i in range(args.showtimes):
+            showtime = Showtime(
+                movie_id=movie.id,
+                start_time=datetime.now() + timedelta(days=1, hours=i),
+                duration=120,
+                auditorium_id=hall.id,
+                available_seats=hall.capacity
+            )
+            db.session.add(showtime)
+            showtimes.append(showtime)
+
+        # One password hash for everyone: hashing per user would dominate the seeding time
+        template = User(username='template', email='template@example.com')
+        template.set_password('loadtest')
+        db.session.execute(insert(User), [
+            {
+                "username": f"loadtest{i}",
+                "email": f"loadtest{i}@example.com",
+                "password_hash": template.password_hash,
+                "role": 'user'
+            }
+            for i in range(args.users)
+        ])
+        db.session.commit()
+
+        user_ids = [user_id for (user_id,) in db.session.query(User.id).filter(User.username.like('loadtest%'))]
+        seat_numbers = [seat_number for seat_number, _, _ in expand_layout({"template": args.layout})]
+        return [showtime.id for showtime in showtimes], user_ids, seat_numbers, hall.capacity
+
+
+def install_stubs(args):
+    """Replace Stripe and email with local stand-ins."""
+    import app as app_module
+
+    class Charge:
+        def __init__(self):
+            self.id = f"ch_loadtest_{random.getrandbits(48):x}"
+
+    def process_stripe_payment(amount, payment_token):
+        time.sleep(args.stripe_latency_ms / 1000)
+        if random.random() < args.decline_rate:
+            raise Exception("card declined")
+        return Charge()
+
+    app_module.process_stripe_payment = process_stripe_payment
+    app_module.send_email = lambda *args, **kwargs: None
+    app_module.send_email_async = lambda *args, **kwargs: None
+
+
+def classify(status_code, body):
+    if status_code in (201, 202):
+        return 'booked'
+    message = (body or {}).get('message', '')
+    if status_code == 503:
+        return 'lock_timeout'
+    if status_code == 400 and ('reserved' in message or 'taken' in message or 'Not enough seats' in message):
+        return 'seat_conflict'
+    if status_code == 400 and 'payment failed' in message:
+        return 'payment_failed'
+    return f'http_{status_code}'
+
+
+def run_worker(args, worker_id, attempts, tokens, showtime_ids, seat_numbers, results):
+    """Run attempts booking requests from args.threads threads; put (outcome, latency_ms) pairs on results."""
+    from app import app, db
+    install_stubs(args)
+    if worker_id or args.processes > 1:
+        with app.app_context():
+            db.engine.dispose(close=False)  # Forked: open our own connections, leave the parent's alone
+    per_thread = [attempts // args.threads + (1 if i < attempts % args.threads else 0) for i in range(args.threads)]
+    collected = []
+    collected_lock = threading.Lock()
+
+    def client_thread(thread_id, count):
+        rng = random.Random(args.seed * 1000003 + worker_id * 1009 + thread_id)
+        client = app.test_client()
+        samples = []
+        for _ in range(count):
+            body = {
+                "showtime_id": rng.choice(showtime_ids),
+                "payment_method": args.payment_method,
+                "payment_token": "tok_loadtest"
+            }
+            if args.mode == 'seat_count':
+                body["seat_count"] = args.seats
+            else:
+                body["seat_numbers"] = rng.sample(seat_numbers, args.seats)
+            headers = {"Authorization": f"Bearer {rng.choice(tokens)}"}
+
+            started = time.perf_counter()
+            try:
+                response = client.post('/reservations', json=body, headers=headers)
+                outcome = classify(response.status_code, response.get_json(silent=True))
+            except Exception as e:  # Propagated from the view, e.g. sqlite3 "database is locked"
+                outcome = 'lock_error' if 'locked' in str(e) else f'error_{type(e).__name__}'
+            samples.append((outcome, (time.perf_counter() - started) * 1000))
+        with collected_lock:
+            collected.extend(samples)
+
+    threads = [threading.Thread(target=client_thread, args=(i, count)) for i, count in enumerate(per_thread)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put(collected)
+
+
+def audit(showtime_ids, capacity):
+    """Count double bookings, oversold showtimes and counter drift after the run."""
+    from app import app
+    from models import db, Showtime
+    from consistency import check_seat_consistency
+    from inventory import recount_seat_counters
+
+    with app.app_context():
+        findings = {}
+        for finding in check_seat_consistency():
+            findings[finding["kind"]] = findings.get(finding["kind"], 0) + 1
+        reserved = dict(db.session.query(Showtime.id, Showtime.reserved_seats).filter(Showtime.id.in_(showtime_ids)))
+        return {
+            "double_booked_seats": findings.get('double_booked', 0),
+            "consistency_findings": findings,
+            "oversold_showtimes": sum(1 for count in reserved.values() if count > capacity),
+            "seats_sold": sum(reserved.values()),
+            "counter_drift": len(recount_seat_counters(apply=False))
+        }
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return round(sorted_values[index], 2)
+
+
+def main():
+    args = parse_args()
+    random.seed(args.seed)
+    configure_environment(args)
+
+    from app import app
+    from flask_jwt_extended import create_access_token
+    # The app issues integer identities, which PyJWT >= 2.10 rejects as 'sub' unless told not to check
+    app.config['JWT_VERIFY_SUB'] = False
+    app.config['PROPAGATE_EXCEPTIONS'] = True  # Surface "database is locked" instead of a generic 500
+    app.logger.setLevel('ERROR')  # Skip the per-booking latency budget warnings
+
+    showtime_ids, user_ids, seat_numbers, capacity = seed_load_data(args)
+    with app.app_context():
+        tokens = [create_access_token(identity=user_id) for user_id in user_ids]
+
+    per_worker = [args.requests // args.processes + (1 if i < args.requests % args.processes else 0)
+                  for i in range(args.processes)]
+    context = multiprocessing.get_context('fork') if args.processes > 1 else None
+    results = context.Queue() if context else multiprocessing.Queue()
+
+    started = time.perf_counter()
+    if context:
+        workers = [
+            context.Process(target=run_worker, args=(args, i, count, tokens, showtime_ids, seat_numbers, results))
+            for i, count in enumerate(per_worker)
+        ]
+        for worker in workers:
+            worker.start()
+        samples = [sample for _ in workers for sample in results.get()]
+        for worker in workers:
+            worker.join()
+    else:
+        run_worker(args, 0, args.requests, tokens, showtime_ids, seat_numbers, results)
+        samples = results.get()
+    elapsed = time.perf_counter() - started
+
+    outcomes = {}
+    for outcome, _ in samples:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    latencies = sorted(latency for _, latency in samples)
+    booked_latencies = sorted(latency for outcome, latency in samples if outcome == 'booked')
+
+    report = {
+        "requests": len(samples),
+        "processes": args.processes,
+        "threads_per_process": args.threads,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 1) if elapsed else None,
+        "bookings_per_second": round(outcomes.get('booked', 0) / elapsed, 1) if elapsed else None,
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p99": percentile(latencies, 99),
+            "max": round(latencies[-1], 2) if latencies else None,
+            "mean": round(statistics.fmean(latencies), 2) if latencies else None
+        },
+        "booked_latency_ms": {"p50": percentile(booked_latencies, 50), "p99": percentile(booked_latencies, 99)},
+        "outcomes": outcomes,
+        "lock_errors": outcomes.get('lock_error', 0) + outcomes.get('lock_timeout', 0),
+        "capacity_per_showtime": capacity,
+        **audit(showtime_ids, capacity)
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"\n{report['requests']} booking attempts in {report['elapsed_seconds']}s "
+          f"({report['processes']} x {report['threads_per_process']} clients)")
+    print(f"Throughput: {report['throughput_rps']} req/s, {report['bookings_per_second']} bookings/s")
+    print(f"Latency: p50 {report['latency_ms']['p50']}ms, p99 {report['latency_ms']['p99']}ms, "
+          f"max {report['latency_ms']['max']}ms")
+    print(f"Outcomes: {json.dumps(outcomes, sort_keys=True)}")
+    print(f"Lock errors: {report['lock_errors']}")
+    print(f"Seats sold: {report['seats_sold']} of {capacity * len(showtime_ids)}")
+    print(f"Double-booked seats: {report['double_booked_seats']}, oversold showtimes: {report['oversold_showtimes']}, "
+          f"counter drift: {report['counter_drift']}")
+
+
+if __name__ == '__main__':
+    main()
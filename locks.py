@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to locks that only cover this process
+    fcntl = None
+
+
+class LockTimeout(Exception):
+    """Raised when a seat lock could not be acquired within the timeout."""
+    pass
+
+
+class HeldSeatLock:
+    """Stripes taken by one SeatLockManager.acquire call."""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.stripes = []
+
+    def release(self):
+        for stripe in reversed(self.stripes):
+            self.manager._release(stripe)
+        self.stripes = []
+
+
+class SeatLockManager:
+    """Cross-process locks keyed by showtime_id, for multi-worker deployments.
+
+    Showtimes are striped over a fixed set of lock files (showtime_id modulo
+    the stripe count) and locked with flock, which every gunicorn worker on
+    the host shares. Stripes are always taken in ascending order so holders
+    of several showtimes cannot deadlock. flock does not exclude threads
+    sharing a descriptor, so each stripe also has a thread lock, taken
+    first; the process then needs only one descriptor per stripe, opened on
+    first use and reopened after a fork.
+
+    Metrics (acquisitions, contention, wait time, timeouts) are per process.
+    """
+
+    def __init__(self, stripes=64, timeout=5.0):
+        self.stripes = stripes
+        self.timeout = timeout
+        self.lock_dir = None
+        self.app = None
+        self._fds = {}  # stripe -> descriptor of its lock file, shared by this process's threads
+        self._thread_locks = [threading.Lock() for _ in range(stripes)]
+        self._stats_lock = threading.Lock()
+        self._stats = {"acquired": 0, "contended": 0, "timeouts": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+
+    def init_app(self, app):
+        self.app = app
+        self.stripes = app.config['SEAT_LOCK_STRIPES']
+        self.timeout = app.config['SEAT_LOCK_TIMEOUT_SECONDS']
+        self.lock_dir = app.config['SEAT_LOCK_DIR']
+        self._thread_locks = [threading.Lock() for _ in range(self.stripes)]
+        os.makedirs(self.lock_dir, exist_ok=True)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # Inherited descriptors share the parent's flocks and the thread locks may be held by parent threads
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds = {}
+        self._thread_locks = [threading.Lock() for _ in range(self.stripes)]
+
+    def stripe(self, showtime_id):
+        return int(showtime_id) % self.stripes
+
+    def _fd(self, stripe):
+        """The stripe's lock file descriptor. Only called while holding the stripe's thread lock."""
+        fd = self._fds.get(stripe)
+        if fd is None:
+            fd = self._fds[stripe] = os.open(os.path.join(self.lock_dir, f"seats-{stripe}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        return fd
+
+    def _try_acquire(self, stripe):
+        thread_lock = self._thread_locks[stripe]
+        if not thread_lock.acquire(blocking=False):
+            return False
+        if fcntl is None:
+            return True
+        try:
+            fcntl.flock(self._fd(stripe), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            thread_lock.release()
+            return False
+        except BaseException:
+            thread_lock.release()
+            raise
+        return True
+
+    def _release(self, stripe):
+        if fcntl is not None:
+            fcntl.flock(self._fd(stripe), fcntl.LOCK_UN)
+        self._thread_locks[stripe].release()
+
+    def _acquire(self, stripe, deadline):
+        """Poll for the stripe with a short backoff. Returns the ms spent waiting, or None on timeout."""
+        started = time.perf_counter()
+        delay = 0.001
+        while not self._try_acquire(stripe):
+            if time.perf_counter() + delay > deadline:
+                return None
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        return (time.perf_counter() - started) * 1000
+
+    def acquire(self, *showtime_ids):
+        """
+        Take the locks of every given showtime. Release the result when done.
+
+        :raises LockTimeout: if a stripe is still busy after the timeout
+        """
+        stripes = sorted({self.stripe(showtime_id) for showtime_id in showtime_ids if showtime_id is not None})
+        started = time.perf_counter()
+        deadline = started + self.timeout
+        held = HeldSeatLock(self)
+        waited = 0.0
+        for stripe in stripes:
+            wait_ms = self._acquire(stripe, deadline)
+            if wait_ms is None:
+                held.release()
+                self._record((time.perf_counter() - started) * 1000, timed_out=True)
+                raise LockTimeout(f"Timed out waiting for the seat lock of showtimes {list(showtime_ids)}")
+            held.stripes.append(stripe)
+            waited += wait_ms
+        self._record(waited)
+        return held
+
+    @contextmanager
+    def lock(self, *showtime_ids):
+        """Hold the locks of every given showtime for the duration of the block."""
+        held = self.acquire(*showtime_ids)
+        try:
+            yield
+        finally:
+            held.release()
+
+    def _record(self, wait_ms, timed_out=False):
+        with self._stats_lock:
+            if timed_out:
+                self._stats["timeouts"] += 1
+            else:
+                self._stats["acquired"] += 1
+            if wait_ms >= 1:
+                self._stats["contended"] += 1
+            self._stats["wait_ms_total"] += wait_ms
+            self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], wait_ms)
+        if timed_out and self.app:
+            self.app.logger.warning(f"Seat lock timed out after {wait_ms:.1f}ms")
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        acquired = stats["acquired"] or 1
+        stats["wait_ms_avg"] = round(stats["wait_ms_total"] / acquired, 3)
+        stats["wait_ms_total"] = round(stats["wait_ms_total"], 3)
+        stats["wait_ms_max"] = round(stats["wait_ms_max"], 3)
+        stats.update(stripes=self.stripes, timeout_seconds=self.timeout, pid=os.getpid())
+        return stats
+
+
+seat_locks = SeatLockManager()
@@ -38,9 +38,12 @@ class Movie(db.Model, SerializerMixin):
     poster_url = db.Column(db.String(500))  
     genre = db.Column(db.String(50), nullable=False)  
     release_date = db.Column(db.Date, nullable=False)  
+    version_id = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # Optimistic concurrency
 
     showtimes = db.relationship('Showtime', backref='movie', cascade="all, delete")
 
+    __mapper_args__ = {'version_id_col': version_id}
+
     serialize_rules = ('-showtimes.movie', '-showtimes.reservations', '-showtimes.seats',)
 
 class Showtime(db.Model, SerializerMixin):
@@ -50,10 +53,48 @@ class Showtime(db.Model, SerializerMixin):
     start_time = db.Column(db.DateTime, nullable=False)
     duration = db.Column(db.Integer, nullable=False)  # Added duration in minutes
     admin_id= db.Column(db.Integer, db.ForeignKey('admins.id'))
+    auditorium_id = db.Column(db.Integer, db.ForeignKey('auditoriums.id'))  # Seat template; seats rows then only hold claimed seats
+    available_seats = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Maintained alongside seat claims/releases
+    reserved_seats = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    admission_ceiling = db.Column(db.Integer)  # Max concurrent bookers when the waiting room is on; NULL = off
+    version_id = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # Not bumped by the seat counters
+    seat_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Bumped with every seat counter change; keys seat map ETags
     reservations = db.relationship('Reservation', backref='showtime', cascade="all, delete")
     seats = db.relationship('Seat', backref='showtime', cascade="all, delete")
 
-    serialize_rules = ('-reservations.showtime', '-seats.showtime', '-reservations.seats', '-seats.reservations',)
+    __table_args__ = (
+        db.Index('ix_showtimes_start_time', 'start_time'),  # Date-range search
+        db.Index('ix_showtimes_movie_start_time', 'movie_id', 'start_time'),  # Same, for one movie
+        db.Index('ix_showtimes_auditorium_start_time', 'auditorium_id', 'start_time'),  # Hall overlap checks
+    )
+    __mapper_args__ = {'version_id_col': version_id}
+
+    serialize_rules = ('-reservations.showtime', '-seats.showtime', '-reservations.seats', '-seats.reservations', '-auditorium',)
+
+class Auditorium(db.Model, SerializerMixin):
+    __tablename__ = 'auditoriums'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    capacity = db.Column(db.Integer, nullable=False, default=0)  # Number of template seats
+
+    seats = db.relationship('AuditoriumSeat', backref='auditorium', cascade="all, delete")
+    showtimes = db.relationship('Showtime', backref='auditorium')
+
+    serialize_rules = ('-seats', '-showtimes',)
+
+class AuditoriumSeat(db.Model, SerializerMixin):
+    __tablename__ = 'auditorium_seats'
+    id = db.Column(db.Integer, primary_key=True)
+    auditorium_id = db.Column(db.Integer, db.ForeignKey('auditoriums.id'), nullable=False)
+    seat_number = db.Column(db.String(10), nullable=False)
+    row = db.Column(db.String(1), nullable=False)
+    column = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('auditorium_id', 'seat_number', name='unique_seat_per_auditorium'),
+    )
+
+    serialize_rules = ('-auditorium',)
 
 class Seat(db.Model, SerializerMixin):
     __tablename__ = 'seats'
@@ -63,10 +104,12 @@ class Seat(db.Model, SerializerMixin):
     column = db.Column(db.Integer, nullable=False)
     is_reserved = db.Column(db.Boolean, default=False)
     showtime_id = db.Column(db.Integer, db.ForeignKey('showtimes.id'), nullable=False)
+    version_id = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
     __table_args__ = (
         db.UniqueConstraint('seat_number', 'showtime_id', name='unique_seat_per_showtime'),
     )
+    __mapper_args__ = {'version_id_col': version_id}
 
     serialize_rules = ('-showtime.seats', '-showtime.reservations', '-seats.reservations',)
 
@@ -77,9 +120,15 @@ class Reservation(db.Model, SerializerMixin):
     showtime_id = db.Column(db.Integer, db.ForeignKey('showtimes.id'), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default='pending')  
+    version_id = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     payment = db.relationship('Payment', backref='reservation', uselist=False, cascade="all, delete-orphan")
     seats = db.relationship('Seat', secondary=reservation_seats)
 
+    __table_args__ = (
+        db.Index('ix_reservations_status_timestamp', 'status', 'timestamp'),  # Expiry job
+    )
+    __mapper_args__ = {'version_id_col': version_id}
+
     serialize_rules = ('-user.reservations', '-showtime.reservations', '-payment.reservation', '-seats.reservations', '-reservation.seats')
 
 class Admin(db.Model, SerializerMixin):
@@ -119,4 +168,55 @@ class AdminReference(db.Model, SerializerMixin):
     __tablename__ = 'admin_references'
     id = db.Column(db.Integer, primary_key=True)
     admin_id = db.Column(db.Integer, db.ForeignKey('admins.id'))
-    reference_text = db.Column(db.String)
\ No newline at end of file
+    reference_text = db.Column(db.String)
+
+class SeatHold(db.Model, SerializerMixin):
+    __tablename__ = 'seat_holds'
+    id = db.Column(db.Integer, primary_key=True)
+    seat_id = db.Column(db.Integer, db.ForeignKey('seats.id'), unique=True, nullable=False)  # A seat has at most one hold
+    showtime_id = db.Column(db.Integer, db.ForeignKey('showtimes.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    reservation_id = db.Column(db.Integer, db.ForeignKey('reservations.id'))  # Set for awaiting_payment/awaiting_verification reservations
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class IdempotencyKey(db.Model, SerializerMixin):
+    __tablename__ = 'idempotency_keys'
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(255), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)  # SHA-256 of method, path and body
+    status_code = db.Column(db.Integer)  # NULL while the first request is still running
+    response_body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('key', 'user_id', name='unique_idempotency_key_per_user'),
+    )
+
+class WaitlistEntry(db.Model, SerializerMixin):
+    __tablename__ = 'waitlist_entries'
+    id = db.Column(db.Integer, primary_key=True)
+    showtime_id = db.Column(db.Integer, db.ForeignKey('showtimes.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    seat_count = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), default='waiting')  # waiting, promoted or left
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    promoted_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_waitlist_fifo', 'showtime_id', 'status', 'id'),  # FIFO scan of waiting entries
+    )
+
+class AdmissionTicket(db.Model, SerializerMixin):
+    __tablename__ = 'admission_tickets'
+    id = db.Column(db.Integer, primary_key=True)
+    showtime_id = db.Column(db.Integer, db.ForeignKey('showtimes.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    status = db.Column(db.String(20), default='waiting')  # waiting, admitted or done
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    admitted_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_admission_queue', 'showtime_id', 'status', 'id'),
+    )
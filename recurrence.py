@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')  # datetime.weekday() order
+
+MAX_RECURRENCE_DAYS = 366
+
+
+def _parse_time(value):
+    try:
+        return datetime.strptime(value, '%H:%M').time()
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid time: {value}. Use HH:MM")
+
+
+def expand_recurrence(spec):
+    """
+    Expand a recurrence spec into showtime start times, in chronological order.
+
+    A spec is {'from': 'YYYY-MM-DD', 'to': 'YYYY-MM-DD', 'times': ['18:00', ...]}
+    with an optional 'days_of_week' list ('mon'..'sun'); without it every
+    day in the range is used. Both ends of the range are included.
+
+    :raises ValueError: if the spec is malformed
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("Recurrence must be an object")
+    try:
+        first_day = datetime.strptime(spec.get('from') or '', '%Y-%m-%d').date()
+        last_day = datetime.strptime(spec.get('to') or '', '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError("from and to must be dates in YYYY-MM-DD format")
+    if last_day < first_day:
+        raise ValueError("to must not be before from")
+    if (last_day - first_day).days >= MAX_RECURRENCE_DAYS:
+        raise ValueError(f"A recurrence can span at most {MAX_RECURRENCE_DAYS} days")
+
+    times = spec.get('times')
+    if not isinstance(times, list) or not times:
+        raise ValueError("times must be a non-empty list of HH:MM times")
+    times = sorted({_parse_time(value) for value in times})
+
+    days_of_week = spec.get('days_of_week') or list(WEEKDAYS)
+    if not isinstance(days_of_week, list):
+        raise ValueError("days_of_week must be a list like ['fri', 'sat']")
+    unknown = [day for day in days_of_week if str(day).lower() not in WEEKDAYS]
+    if unknown:
+        raise ValueError(f"Unknown days_of_week: {', '.join(map(str, unknown))}")
+    weekdays = {WEEKDAYS.index(str(day).lower()) for day in days_of_week}
+
+    return [
+        datetime.combine(first_day + timedelta(days=n), at)
+        for n in range((last_day - first_day).days + 1)
+        if (first_day + timedelta(days=n)).weekday() in weekdays
+        for at in times
+    ]
@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from models import db, Showtime, Movie
+from seat_store import seat_store
+
+
+class ScheduleCache:
+    """Per-day schedule rows for GET /schedule, kept in memory.
+
+    Missing or stale days are loaded with one start_time range query. After
+    that the cache is patched in place: create_showtime adds the new row and
+    seat changes refresh a showtime's availability from the seat store.
+    Changes made by other workers show up once a day's entry is older than
+    max_age seconds. At most max_days days are kept; the least recently
+    used ones are evicted first.
+    """
+
+    def __init__(self, max_age=60, max_days=64):
+        self.max_age = max_age
+        self.max_days = max_days
+        self._lock = threading.Lock()
+        self._days = OrderedDict()  # date -> (loaded_at, {showtime_id: row}), least recently used first
+        self._showtime_days = {}  # showtime_id -> date
+
+    def grid(self, first_day, days):
+        """
+        Return the schedule from first_day for days days, grouped by movie then day.
+
+        :return: List of {"movie_id", "title", "days": {iso date: [showtimes]}} sorted by title
+        """
+        wanted = [first_day + timedelta(days=n) for n in range(days)]
+        self._load([day for day in wanted if self._stale(day)])
+
+        movies = {}
+        with self._lock:
+            for day in wanted:
+                if day in self._days:
+                    self._days.move_to_end(day)
+                for row in self._days.get(day, (None, {}))[1].values():
+                    movie = movies.setdefault(row["movie_id"], {
+                        "movie_id": row["movie_id"],
+                        "title": row["title"],
+                        "days": {d.isoformat(): [] for d in wanted}
+                    })
+                    movie["days"][day.isoformat()].append({
+                        "showtime_id": row["showtime_id"],
+                        "start_time": row["start_time"].isoformat(),
+                        "duration": row["duration"],
+                        "available_seats": row["available_seats"]
+                    })
+        for movie in movies.values():
+            for showtimes in movie["days"].values():
+                showtimes.sort(key=lambda showtime: showtime["start_time"])
+        return sorted(movies.values(), key=lambda movie: movie["title"])
+
+    def _stale(self, day):
+        with self._lock:
+            cached = self._days.get(day)
+        return cached is None or time.monotonic() - cached[0] > self.max_age
+
+    def _load(self, days):
+        """Reload the given days with one range query over start_time."""
+        if not days:
+            return
+        start = datetime.combine(min(days), datetime.min.time())
+        end = datetime.combine(max(days) + timedelta(days=1), datetime.min.time())
+        rows = db.session.execute(
+            select(Showtime.id, Showtime.movie_id, Movie.title, Showtime.start_time, Showtime.duration,
+                   Showtime.available_seats)
+            .join(Movie, Showtime.movie_id == Movie.id)
+            .where(Showtime.start_time >= start, Showtime.start_time < end)
+        )
+        loaded = {day: {} for day in days}
+        for showtime_id, movie_id, title, start_time, duration, available_seats in rows:
+            day = start_time.date()
+            if day in loaded:
+                loaded[day][showtime_id] = self._row(showtime_id, movie_id, title, start_time, duration, available_seats)
+
+        now = time.monotonic()
+        with self._lock:
+            for day, showtimes in loaded.items():
+                for showtime_id in self._days.get(day, (None, {}))[1]:
+                    self._showtime_days.pop(showtime_id, None)
+                self._days[day] = (now, showtimes)
+                self._days.move_to_end(day)
+                self._showtime_days.update(dict.fromkeys(showtimes, day))
+            while len(self._days) > self.max_days:
+                for showtime_id in self._days.popitem(last=False)[1][1]:
+                    self._showtime_days.pop(showtime_id, None)
+
+    @staticmethod
+    def _row(showtime_id, movie_id, title, start_time, duration, available_seats):
+        return {
+            "showtime_id": showtime_id,
+            "movie_id": movie_id,
+            "title": title,
+            "start_time": start_time,
+            "duration": duration,
+            "available_seats": available_seats
+        }
+
+    def showtime_created(self, showtime, title):
+        """Add a committed showtime to its day, if that day is cached."""
+        day = showtime.start_time.date()
+        with self._lock:
+            cached = self._days.get(day)
+            if cached is not None:
+                cached[1][showtime.id] = self._row(showtime.id, showtime.movie_id, title, showtime.start_time,
+                                                   showtime.duration, showtime.available_seats)
+                self._showtime_days[showtime.id] = day
+
+    def seats_changed(self, showtime_id):
+        """Refresh a cached showtime's availability from the seat store."""
+        with self._lock:
+            day = self._showtime_days.get(showtime_id)
+        if day is None:
+            return
+        available = seat_store.available_count(showtime_id)
+        with self._lock:
+            row = self._days.get(day, (None, {}))[1].get(showtime_id)
+            if row is not None:
+                row["available_seats"] = available
+
+    def forget_days(self, days):
+        """Drop cached days so they are reloaded on next use."""
+        with self._lock:
+            for day in days:
+                for showtime_id in self._days.pop(day, (None, {}))[1]:
+                    self._showtime_days.pop(showtime_id, None)
+
+    def clear(self):
+        """Forget everything, e.g. after movies are renamed or deleted."""
+        with self._lock:
+            self._days = OrderedDict()
+            self._showtime_days = {}
+
+
+schedule_cache = ScheduleCache()
@@ -0,0 +1,275 @@
+import base64
+import itertools
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from models import db, Seat, Showtime, AuditoriumSeat
+
+
+class SeatLayout:
+    """Seat grid of a hall: seat numbers in a fixed order plus the row/column grid.
+
+    Showtimes of the same auditorium share one SeatLayout; ``rows`` maps a row
+    label to that row's seat indexes ordered by column, and ``grid_order``
+    lists every seat index row by row, the order used by seat maps.
+    """
+    __slots__ = ('seat_numbers', 'index', 'rows', 'grid_order', 'row_summary')
+
+    def __init__(self, positions):
+        """positions: iterable of (seat_number, row, column)."""
+        self.seat_numbers = []
+        rows = {}
+        for i, (seat_number, row, column) in enumerate(positions):
+            self.seat_numbers.append(seat_number)
+            rows.setdefault(row, []).append((column, i))
+        self.index = {seat_number: i for i, seat_number in enumerate(self.seat_numbers)}
+        self.rows = {row: sorted(seats) for row, seats in sorted(rows.items())}
+        self.grid_order = [i for seats in self.rows.values() for _, i in seats]
+
+        # Seat map row headers: a column count for rows numbered 1..n, else the column list
+        self.row_summary = []
+        for row, seats in self.rows.items():
+            columns = [column for column, _ in seats]
+            if columns == list(range(1, len(columns) + 1)):
+                self.row_summary.append({"row": row, "columns": len(columns)})
+            else:
+                self.row_summary.append({"row": row, "columns": columns})
+
+
+class ShowtimeSeats:
+    """Reserved-seat bitset for a single showtime.
+
+    Bit ``i`` is set when ``layout.seat_numbers[i]`` is reserved. ``version``
+    goes up on every change and keys the cached seat map; ``seat_version`` is
+    the showtime's Showtime.seat_version when the bitset was loaded.
+    """
+    __slots__ = ('layout', 'bits', 'seat_version', 'version', '_seatmap')
+
+    def __init__(self, layout, reserved_numbers=(), seat_version=0):
+        self.layout = layout
+        self.bits = bytearray((len(layout.seat_numbers) + 7) // 8)
+        self.seat_version = seat_version
+        self.version = 0
+        self._seatmap = None
+        self.mark(reserved_numbers, True)
+
+    def mark(self, seat_numbers, reserved):
+        """Set or clear the bits for seat_numbers. Returns False if any seat is unknown."""
+        known = True
+        for seat_number in seat_numbers:
+            i = self.layout.index.get(seat_number)
+            if i is None:
+                known = False
+                continue
+            if reserved:
+                self.bits[i >> 3] |= 1 << (i & 7)
+            else:
+                self.bits[i >> 3] &= ~(1 << (i & 7)) & 0xFF
+        self.version += 1
+        return known
+
+    def is_reserved(self, seat_number):
+        return self._bit(self.layout.index[seat_number])
+
+    def reserved_numbers(self):
+        return {seat_number for i, seat_number in enumerate(self.layout.seat_numbers) if self._bit(i)}
+
+    def _bit(self, i):
+        return bool(self.bits[i >> 3] & (1 << (i & 7)))
+
+    def row_occupancy(self):
+        """Return [(row, [(column, seat_number, is_free), ...]), ...] in row and column order."""
+        seat_numbers = self.layout.seat_numbers
+        return [
+            (row, [(column, seat_numbers[i], not self._bit(i)) for column, i in seats])
+            for row, seats in self.layout.rows.items()
+        ]
+
+    def seatmap(self, encoding='bitstring'):
+        """
+        Compact seat map in grid order (rows in order, columns ascending).
+
+        'bitstring' gives the reserved mask as base64, most significant bit
+        first, one bit per seat; 'rle' gives alternating run lengths starting
+        with a run of free seats. Results are cached until the next change.
+        """
+        if self._seatmap and self._seatmap[0] == (self.version, encoding):
+            return self._seatmap[1]
+
+        reserved = [self._bit(i) for i in self.layout.grid_order]
+        payload = {
+            "rows": self.layout.row_summary,
+            "capacity": self.capacity,
+            "available": self.available_count,
+            "encoding": encoding
+        }
+        if encoding == 'rle':
+            runs = [(is_reserved, len(list(group))) for is_reserved, group in itertools.groupby(reserved)]
+            if runs and runs[0][0]:
+                runs.insert(0, (False, 0))
+            payload["reserved"] = [length for _, length in runs]
+        else:
+            packed = bytearray((len(reserved) + 7) // 8)
+            for n, is_reserved in enumerate(reserved):
+                if is_reserved:
+                    packed[n >> 3] |= 0x80 >> (n & 7)
+            payload["reserved"] = base64.b64encode(bytes(packed)).decode('ascii')
+
+        self._seatmap = ((self.version, encoding), payload)
+        return payload
+
+    @property
+    def capacity(self):
+        return len(self.layout.seat_numbers)
+
+    @property
+    def reserved_count(self):
+        return int.from_bytes(self.bits, 'little').bit_count()
+
+    @property
+    def available_count(self):
+        return self.capacity - self.reserved_count
+
+
+class SeatStore:
+    """Process-wide cache of seat state, one ShowtimeSeats bitset per showtime.
+
+    Built from the seats table (and auditorium templates) on startup or first
+    use for the showtimes that have not ended yet, and kept in step with this process's commits by calling
+    mark_reserved / mark_available with seat numbers. Showtimes the store has
+    not seen yet are loaded on demand. Other workers' commits are picked up by
+    refresh(), which compares the bitset with Showtime.seat_version; seat maps
+    always refresh first, so their ETags follow the database, not this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._showtimes = {}
+        self._layouts = {}  # auditorium_id -> SeatLayout
+        self._loaded = False
+
+    def _auditorium_layout(self, auditorium_id):
+        layout = self._layouts.get(auditorium_id)
+        if layout is None:
+            positions = db.session.query(AuditoriumSeat.seat_number, AuditoriumSeat.row, AuditoriumSeat.column) \
+                .filter(AuditoriumSeat.auditorium_id == auditorium_id).order_by(AuditoriumSeat.id).all()
+            layout = self._layouts.setdefault(auditorium_id, SeatLayout(positions))
+        return layout
+
+    def _build(self, auditorium_id, seat_version, seat_rows):
+        """seat_rows: (seat_number, row, column, is_reserved) for one showtime's seats."""
+        reserved = [seat_number for seat_number, _, _, is_reserved in seat_rows if is_reserved]
+        if auditorium_id is not None:
+            layout = self._auditorium_layout(auditorium_id)
+        else:
+            layout = SeatLayout((seat_number, row, column) for seat_number, row, column, _ in seat_rows)
+        return ShowtimeSeats(layout, reserved, seat_version)
+
+    def rebuild(self):
+        """
+        Reload the bitsets of showtimes that may still be running, with one scan of their seats.
+
+        Past showtimes are dropped and only loaded again if someone asks for them.
+        """
+        longest = db.session.query(func.max(Showtime.duration)).scalar() or 0
+        upcoming = Showtime.start_time > datetime.utcnow() - timedelta(minutes=longest)
+        # Versions are read before the seats, so a bitset is never labelled newer than its contents
+        showtimes = db.session.query(Showtime.id, Showtime.auditorium_id, Showtime.seat_version) \
+            .filter(upcoming).all()
+        rows = db.session.query(Seat.showtime_id, Seat.seat_number, Seat.row, Seat.column, Seat.is_reserved) \
+            .join(Showtime, Seat.showtime_id == Showtime.id).filter(upcoming) \
+            .order_by(Seat.showtime_id, Seat.id).all()
+
+        grouped = {}
+        for showtime_id, *seat_row in rows:
+            grouped.setdefault(showtime_id, []).append(seat_row)
+
+        self._layouts = {}
+        built = {
+            showtime_id: self._build(auditorium_id, seat_version, grouped.get(showtime_id, []))
+            for showtime_id, auditorium_id, seat_version in showtimes
+        }
+        with self._lock:
+            self._showtimes = built
+            self._loaded = True
+
+    def _load_showtime(self, showtime_id):
+        auditorium_id, seat_version = db.session.query(Showtime.auditorium_id, Showtime.seat_version) \
+            .filter(Showtime.id == showtime_id).first() or (None, 0)
+        rows = db.session.query(Seat.seat_number, Seat.row, Seat.column, Seat.is_reserved) \
+            .filter(Seat.showtime_id == showtime_id).order_by(Seat.id).all()
+        return self._build(auditorium_id, seat_version, rows)
+
+    def get(self, showtime_id):
+        """Return the ShowtimeSeats for showtime_id, loading it if needed."""
+        if not self._loaded:
+            self.rebuild()
+        with self._lock:
+            seats = self._showtimes.get(showtime_id)
+        if seats is None:
+            seats = self._load_showtime(showtime_id)
+            with self._lock:
+                seats = self._showtimes.setdefault(showtime_id, seats)
+        return seats
+
+    def available_count(self, showtime_id):
+        seats = self.get(showtime_id)
+        with self._lock:
+            return seats.available_count
+
+    def row_occupancy(self, showtime_id):
+        seats = self.get(showtime_id)
+        with self._lock:
+            return seats.row_occupancy()
+
+    def refresh(self, showtime_id):
+        """
+        Reload a showtime if its Showtime.seat_version moved past our copy, e.g. after another worker's commit.
+
+        Costs one primary-key lookup when nothing changed.
+
+        :return: (ShowtimeSeats, claimed seat numbers, released seat numbers) relative to the old copy
+        """
+        seats = self.get(showtime_id)
+        current = db.session.query(Showtime.seat_version).filter(Showtime.id == showtime_id).scalar()
+        if current is None or current == seats.seat_version:
+            return seats, [], []
+
+        fresh = self._load_showtime(showtime_id)
+        with self._lock:
+            latest = self._showtimes.get(showtime_id, seats)
+            if latest is not seats and latest.seat_version >= fresh.seat_version:
+                return latest, [], []  # Another thread already reloaded it
+            before, after = latest.reserved_numbers(), fresh.reserved_numbers()
+            self._showtimes[showtime_id] = fresh
+        return fresh, sorted(after - before), sorted(before - after)
+
+    def seatmap(self, showtime_id, encoding='bitstring'):
+        """Return (etag, payload) for a showtime's compact seat map, refreshed from the database first."""
+        seats, _, _ = self.refresh(showtime_id)
+        with self._lock:
+            payload = seats.seatmap(encoding)
+            etag = f"{showtime_id}-{seats.seat_version}-{encoding}"
+        return etag, payload
+
+    def _mark(self, showtime_id, seat_numbers, reserved):
+        seats = self.get(showtime_id)
+        with self._lock:
+            known = seats.mark(seat_numbers, reserved)
+        if not known:
+            # The showtime gained seats we have not seen; reload it next time.
+            self.invalidate(showtime_id)
+
+    def mark_reserved(self, showtime_id, seat_numbers):
+        self._mark(showtime_id, seat_numbers, True)
+
+    def mark_available(self, showtime_id, seat_numbers):
+        self._mark(showtime_id, seat_numbers, False)
+
+    def invalidate(self, showtime_id):
+        """Drop a showtime's bitset so it is reloaded from the database on next use."""
+        with self._lock:
+            self._showtimes.pop(showtime_id, None)
+
+
+seat_store = SeatStore()
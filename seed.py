@@ -1,5 +1,7 @@
 from app import app, db
-from models import User, Movie, Showtime, Seat, Reservation, Payment, Admin, AdminReference
+from models import User, Movie, Showtime, Seat, Reservation, Payment, Admin, AdminReference, Auditorium
+from inventory import recount_seat_counters, create_auditorium, claim_seat_numbers
+from layouts import expand_layout
 from datetime import datetime, timedelta
 import random
 
@@ -39,11 +41,22 @@ def seed_data():
 
         db.session.flush()  # To update the session with the new users
 
+        # Seed one 20-seat auditorium (rows A-D, columns 1-5) shared by every showtime
+        hall = Auditorium.query.filter_by(name="Hall 1").first()
+        if not hall:
+            hall = create_auditorium("Hall 1", expand_layout({"rows": 4, "columns": 5}))
+
         # Genres for movies
         genres = ["Action", "Comedy", "Drama", "Horror", "Sci-Fi"]
 
+        # Every showtime gets its own slot in the shared hall; slots are longer than the
+        # longest seeded film, so no two showtimes overlap
+        slot = timedelta(hours=3, minutes=15)
+        first_start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        movie_count = len(genres) * 2
+
         # Seed movies (2 per genre, 10 total)
-        for genre in genres:
+        for g, genre in enumerate(genres):
             for i in range(1, 3):  # Only 2 movies per genre now
                 movie_title = f"{genre} Movie {i}"
                 movie_description = f"A thrilling {genre.lower()} movie with gripping moments."
@@ -61,42 +74,32 @@ def seed_data():
 
                     # Seed showtimes for each movie (3 showtimes per movie)
                     for j in range(3):  # Reduced to 3 showtimes per movie
-                        start_time = datetime.now() + timedelta(days=j, hours=random.randint(1, 3))
+                        start_time = first_start + slot * (j * movie_count + g * 2 + i - 1)
+                        # Seats come from the hall template; only claimed seats get rows
                         showtime = Showtime(
                             movie_id=movie.id,
                             start_time=start_time,
-                            duration=random.randint(90, 180)  # Random duration between 90 and 180 minutes
+                            duration=random.randint(90, 180),  # Random duration between 90 and 180 minutes
+                            auditorium_id=hall.id,
+                            available_seats=hall.capacity
                         )
                         db.session.add(showtime)
-                        db.session.flush()  # Save the showtime to get its ID
-
-                        # Seed 20 seats per showtime
-                        for seat_num in range(1, 21):  # 20 seats per showtime
-                            row = "ABCDE"[seat_num // 5]  # Rows A-E
-                            column = seat_num % 5 or 5  # Columns 1-5
-                            seat = Seat(
-                                seat_number=f"{row}{column}",
-                                row=row,
-                                column=column,
-                                showtime_id=showtime.id,
-                                is_reserved=False
-                            )
-                            db.session.add(seat)
 
         db.session.flush()
 
         # Seed reservations for user1 on some showtimes and seats
         showtimes = Showtime.query.limit(5).all()
         for showtime in showtimes:
+            # Re-running the seed must not try to claim the same seats again
+            if Reservation.query.filter_by(showtime_id=showtime.id).first():
+                continue
             reservation = Reservation(user_id=user1.id, showtime_id=showtime.id)
             db.session.add(reservation)
             db.session.flush()  # Save the reservation to get its ID
 
             # Reserve first 3 seats for this reservation
-            seats = Seat.query.filter_by(showtime_id=showtime.id).limit(3).all()
-            for seat in seats:
-                seat.is_reserved = True
-                reservation.seats.append(seat)
+            seat_ids = claim_seat_numbers(showtime.id, ["A1", "A2", "A3"])
+            reservation.seats = Seat.query.filter(Seat.id.in_(seat_ids)).all()
 
             # Optionally seed a payment for the reservation
             payment = Payment(
@@ -108,6 +111,10 @@ def seed_data():
             )
             db.session.add(payment)
 
+        # Bring the denormalized showtime seat counters in line with the seeded seats
+        db.session.flush()
+        recount_seat_counters()
+
         # Commit all changes
         db.session.commit()
         print("Database seeded with movies, showtimes, seats, reservations, and payments.")
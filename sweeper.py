@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from models import db
+from inventory import release_expired_holds, expire_unpaid_reservations
+from idempotency import purge_idempotency_keys
+from admission import admission
+from events import seats_changed
+
+
+def sweep_expired_holds(now=None):
+    """Release expired seat holds, commit, and publish the changes. Returns the number of seats freed."""
+    released = release_expired_holds(now or datetime.utcnow())
+    db.session.commit()
+    for showtime_id, seat_numbers in released.items():
+        seats_changed(showtime_id, released=seat_numbers)
+    return sum(len(seat_numbers) for seat_numbers in released.values())
+
+
+# Per-process totals of the reservation expiry job, served by GET /admin/reservation-expiry
+expiry_metrics = {"runs": 0, "reservations_expired": 0, "seats_released": 0, "last_run_at": None, "last_duration_ms": None}
+_metrics_lock = threading.Lock()
+
+
+def expire_reservations(ttl, now=None, batch_size=500):
+    """
+    Expire unpaid reservations older than ttl, one committed batch at a time, and publish freed seats.
+
+    :return: (number of reservations expired, number of seats freed)
+    """
+    now = now or datetime.utcnow()
+    started = time.perf_counter()
+    expired_total = seats_total = 0
+    while True:
+        expired, released = expire_unpaid_reservations(now - ttl, batch_size)
+        if not expired:
+            break
+        db.session.commit()
+        for showtime_id, seat_numbers in released.items():
+            seats_changed(showtime_id, released=seat_numbers)
+        expired_total += expired
+        seats_total += sum(len(seat_numbers) for seat_numbers in released.values())
+        if expired < batch_size:
+            break
+
+    with _metrics_lock:
+        expiry_metrics["runs"] += 1
+        expiry_metrics["reservations_expired"] += expired_total
+        expiry_metrics["seats_released"] += seats_total
+        expiry_metrics["last_run_at"] = now.isoformat()
+        expiry_metrics["last_duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return expired_total, seats_total
+
+
+def start_hold_sweeper(app, interval=30):
+    """
+    Every interval seconds on a daemon thread: release expired holds, expire unpaid
+    reservations, and drop old idempotency keys and admission tickets.
+    """
+    def run():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    released = sweep_expired_holds()
+                    if released:
+                        app.logger.info(f"Released {released} seats from expired holds")
+                    expired, freed = expire_reservations(
+                        timedelta(minutes=app.config['RESERVATION_PAYMENT_TTL_MINUTES']),
+                        batch_size=app.config['RESERVATION_EXPIRY_BATCH_SIZE']
+                    )
+                    if expired:
+                        app.logger.info(f"Expired {expired} unpaid reservations, releasing {freed} seats")
+                    key_ttl = timedelta(hours=app.config['IDEMPOTENCY_KEY_TTL_HOURS'])
+                    purge_idempotency_keys(datetime.utcnow() - key_ttl)
+                    admission.purge(datetime.utcnow() - timedelta(hours=app.config['ADMISSION_TICKET_TTL_HOURS']))
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error(f"Seat hold sweep failed: {str(e)}")
+
+    thread = threading.Thread(target=run, name='seat-hold-sweeper', daemon=True)
+    thread.start()
+    return thread
+
+
+_sweeper_lock = threading.Lock()
+_sweeper_pid = None
+
+
+def ensure_hold_sweeper(app):
+    """
+    Start this process's sweeper unless it is already running. Cheap enough to call on every request.
+
+    Keyed by pid because threads do not survive a fork, so every gunicorn
+    worker (preloaded or not) gets exactly one sweeper. SEAT_HOLD_SWEEP_SECONDS=0
+    turns it off, e.g. when a cron runs `flask sweep-holds` instead.
+    """
+    global _sweeper_pid
+    interval = app.config['SEAT_HOLD_SWEEP_SECONDS']
+    if _sweeper_pid == os.getpid() or interval <= 0:
+        return
+    with _sweeper_lock:
+        if _sweeper_pid != os.getpid():
+            start_hold_sweeper(app, interval)
+            _sweeper_pid = os.getpid()
@@ -0,0 +1,105 @@
+import queue
+import threading
+from datetime import datetime
+from sqlalchemy import func
+from models import db, WaitlistEntry
+from seat_store import seat_store
+from events import seats_changed
+from inventory import create_holds, seat_numbers_for, SeatUnavailableError
+from allocation import claim_best_available
+
+
+def waitlist_position(entry):
+    """1-based position of a waiting entry in its showtime's queue."""
+    return db.session.query(func.count(WaitlistEntry.id)).filter(
+        WaitlistEntry.showtime_id == entry.showtime_id,
+        WaitlistEntry.status == 'waiting',
+        WaitlistEntry.id <= entry.id
+    ).scalar()
+
+
+def promote_waiters(showtime_id, hold_expires_at, batch_size=20):
+    """
+    Hand freed seats to the front of a showtime's waitlist.
+
+    Reads up to batch_size waiting entries in FIFO order with one indexed
+    query and, while enough seats are free, holds seats for each entry in
+    its own short transaction. Stops at the first entry that doesn't fit so
+    nobody is overtaken.
+
+    :return: List of (entry, seat_numbers) that were promoted
+    """
+    entries = WaitlistEntry.query.filter_by(showtime_id=showtime_id, status='waiting') \
+        .order_by(WaitlistEntry.id).limit(batch_size).all()
+
+    promoted = []
+    for entry in entries:
+        if seat_store.available_count(showtime_id) < entry.seat_count:
+            break
+        entry_id, user_id, seat_count = entry.id, entry.user_id, entry.seat_count
+        try:
+            seat_ids = claim_best_available(showtime_id, seat_count)
+        except SeatUnavailableError:
+            break
+        create_holds(showtime_id, seat_ids, user_id, hold_expires_at)
+        seat_numbers = sorted(seat_numbers_for(seat_ids))
+        entry = db.session.get(WaitlistEntry, entry_id)
+        entry.status = 'promoted'
+        entry.promoted_at = datetime.utcnow()
+        db.session.commit()
+        seats_changed(showtime_id, claimed=seat_numbers)
+        promoted.append((entry, seat_numbers))
+    return promoted
+
+
+class WaitlistPromoter:
+    """Runs promote_waiters off the request path.
+
+    request_promotion() is cheap and safe to call after any commit that
+    frees seats; showtimes are de-duplicated and processed on one daemon
+    thread, which is started on first use.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.app = None
+        self.notify = None
+        self.hold_expiry = None
+
+    def init_app(self, app, hold_expiry, notify):
+        """notify(user_id, showtime_id, seat_numbers, expires_at) is called for each promotion."""
+        self.app = app
+        self.hold_expiry = hold_expiry
+        self.notify = notify
+
+    def request_promotion(self, showtime_id):
+        if self.app is None:
+            return
+        with self._lock:
+            if showtime_id in self._pending:
+                return
+            self._pending.add(showtime_id)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='waitlist-promoter', daemon=True)
+                self._thread.start()
+        self._queue.put(showtime_id)
+
+    def _run(self):
+        while True:
+            showtime_id = self._queue.get()
+            with self._lock:
+                self._pending.discard(showtime_id)
+            with self.app.app_context():
+                try:
+                    expires_at = self.hold_expiry()
+                    for entry, seat_numbers in promote_waiters(showtime_id, expires_at):
+                        self.notify(entry.user_id, showtime_id, seat_numbers, expires_at)
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.error(f"Waitlist promotion for showtime {showtime_id} failed: {str(e)}")
+
+
+waitlist_promoter = WaitlistPromoter()